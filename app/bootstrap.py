@@ -0,0 +1,23 @@
+"""
+Application startup.
+
+Importing the app modules has no side effects: the database engine, the
+Jira and Ollama clients are created on first use. Everything that has to
+happen once per process (logging, schema setup, the Telegram bot and its
+state storage) is done here.
+"""
+import logging
+
+from app.core.config import settings
+from app.core.database import init_db
+from app.services.telegram import create_bot
+
+logger = logging.getLogger(__name__)
+
+
+def bootstrap():
+    """Prepare the process for running the bot."""
+    logging.basicConfig(level=logging.INFO)
+    logger.info(f"Settings:\n{settings}")
+    init_db()
+    create_bot()
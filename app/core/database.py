@@ -1,4 +1,8 @@
-from sqlalchemy import create_engine, Column, Integer, String, BigInteger
+from contextlib import contextmanager
+
+from sqlalchemy import (
+    create_engine, event, Boolean, Column, Integer, String, BigInteger, Date, DateTime, Text, UniqueConstraint
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from .config import settings
@@ -12,15 +16,134 @@ class User(Base):
     telegram_id = Column(BigInteger, unique=True, index=True)
     jira_token = Column(String, nullable=True)
 
-engine = create_engine(settings.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+class LLMCacheEntry(Base):
+    __tablename__ = "llm_cache"
+
+    key = Column(String(64), primary_key=True)
+    model = Column(String, nullable=False)
+    response = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    last_used_at = Column(DateTime, nullable=False, index=True)
+
+class Worklog(Base):
+    __tablename__ = "worklogs"
+    __table_args__ = (UniqueConstraint("telegram_id", "worklog_id"),)
+
+    id = Column(Integer, primary_key=True)
+    telegram_id = Column(BigInteger, nullable=False, index=True)
+    worklog_id = Column(BigInteger, nullable=False)
+    issue_id = Column(BigInteger, nullable=False)
+    issue_key = Column(String, nullable=False)
+    issue_summary = Column(String, nullable=False)
+    started = Column(String, nullable=False)
+    started_date = Column(Date, nullable=False, index=True)
+    time_spent = Column(String, nullable=False)
+    time_spent_seconds = Column(Integer, nullable=False)
+    comment = Column(Text, nullable=True)
+    author = Column(String, nullable=False)
+    created = Column(String, nullable=False)
+    updated = Column(String, nullable=False)
+
+class WorklogAuthor(Base):
+    __tablename__ = "worklog_authors"
+
+    telegram_id = Column(BigInteger, primary_key=True)
+    author = Column(String, nullable=False, index=True)
+    # Отложенные ворклоги до этой отметки уже проверены токеном пользователя
+    pending_since = Column(BigInteger, nullable=False)
+
+class WorklogPending(Base):
+    __tablename__ = "worklog_pending"
+
+    # Ворклог из общей ленты, который не удалось прочитать токеном, синхронизировавшим ленту
+    worklog_id = Column(BigInteger, primary_key=True)
+    seen_at = Column(BigInteger, nullable=False, index=True)
+
+class WorklogFeedState(Base):
+    __tablename__ = "worklog_feed_state"
+
+    id = Column(Integer, primary_key=True)
+    since = Column(BigInteger, nullable=False)
+    synced_at = Column(DateTime, nullable=False)
+
+class DigestSubscription(Base):
+    __tablename__ = "digest_subscriptions"
+
+    telegram_id = Column(BigInteger, primary_key=True)
+    chat_id = Column(BigInteger, nullable=False)
+    neuro = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime, nullable=False)
 
-def get_db():
+class DigestDelivery(Base):
+    __tablename__ = "digest_deliveries"
+
+    # Первая реплика, вставившая строку, отправляет отчет за этот период
+    telegram_id = Column(BigInteger, primary_key=True)
+    boundary = Column(DateTime, primary_key=True)
+    claimed_at = Column(DateTime, nullable=False)
+
+class BotState(Base):
+    __tablename__ = "bot_states"
+
+    chat_id = Column(BigInteger, primary_key=True)
+    user_id = Column(BigInteger, primary_key=True)
+    state = Column(String, nullable=True)
+    data = Column(Text, nullable=False)
+    updated_at = Column(DateTime, nullable=False, index=True)
+
+def _create_engine():
+    if settings.DATABASE_URL.startswith("sqlite"):
+        engine = create_engine(
+            settings.DATABASE_URL,
+            connect_args={"check_same_thread": False, "timeout": 30},
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+        )
+
+        @event.listens_for(engine, "connect")
+        def _set_sqlite_pragma(dbapi_connection, connection_record):
+            # WAL позволяет читать параллельно с записью
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute("PRAGMA busy_timeout=30000")
+            cursor.close()
+
+        return engine
+
+    return create_engine(
+        settings.DATABASE_URL,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_pre_ping=True,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+    )
+
+_engine = None
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False)
+
+def get_engine():
+    """Движок базы данных; создается при первом обращении, а не при импорте."""
+    global _engine
+    if _engine is None:
+        _engine = _create_engine()
+        SessionLocal.configure(bind=_engine)
+    return _engine
+
+def init_db():
+    """Создает таблицы. Выполняется один раз при запуске приложения."""
+    Base.metadata.create_all(bind=get_engine())
+
+@contextmanager
+def session_scope():
+    """Сессия на одну операцию: фиксирует изменения при успехе и откатывает при ошибке."""
+    get_engine()
     db = SessionLocal()
     try:
         yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
     finally:
         db.close()
-
-# Создаем таблицы
-Base.metadata.create_all(bind=engine)
@@ -0,0 +1,195 @@
+"""
+Minimal in-process metrics in the Prometheus text exposition format.
+
+Counters, gauges and histograms are registered in a global registry and
+rendered by the /metrics endpoint; the same values back the /stats command.
+"""
+import math
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """Base class of a metric family with a fixed set of label names."""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), callback: Optional[Callable] = None):
+        """
+        Args:
+            name (str): Metric name
+            documentation (str): Help text
+            labels (tuple): Label names
+            callback (Callable): Function returning the current value of an unlabelled metric,
+                for values already tracked elsewhere
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.callback = callback
+        self._values = {}  # значения меток -> значение метрики
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"Metric {self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def label_sets(self) -> list:
+        """Label values of every observed series, as dicts."""
+        return [dict(zip(self.label_names, key)) for key in sorted(self._values)]
+
+    def samples(self):
+        """Yields (suffix, label values, extra label, value) tuples."""
+        if self.callback is not None:
+            yield "", (), "", self.callback()
+            return
+        for key, value in sorted(self._values.items()):
+            yield "", key, "", value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(
+                f"{self.name}{suffix}{_format_labels(self.label_names, key, extra)} {_format_value(value)}"
+            )
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        if self.callback is not None:
+            return self.callback()
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    value = Counter.value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            # [счетчики по корзинам, сумма, количество]
+            state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[0][i] += 1
+                break
+        state[1] += value
+        state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the duration of the `with` block in seconds."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def summary(self, **labels) -> dict:
+        """Count, mean and bucket-interpolated p50/p95 for one label set."""
+        state = self._values.get(self._key(labels))
+        if not state or not state[2]:
+            return {"count": 0, "sum": 0.0, "mean": 0.0, "p50": 0.0, "p95": 0.0}
+        return {
+            "count": state[2],
+            "sum": state[1],
+            "mean": state[1] / state[2],
+            "p50": self._quantile(state, 0.5),
+            "p95": self._quantile(state, 0.95),
+        }
+
+    def _quantile(self, state, q: float) -> float:
+        rank = q * state[2]
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, state[0]):
+            if count and seen + count >= rank:
+                if bound == math.inf:
+                    return lower
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return lower
+
+    def samples(self):
+        for key, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                yield "_bucket", key, f'le="{_format_value(bound)}"', cumulative
+            yield "_sum", key, "", total
+            yield "_count", key, "", count
+
+
+class MetricsRegistry:
+    """Named collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: tuple = (), callback: Callable = None) -> Counter:
+        return self._register(Counter(name, documentation, labels, callback))
+
+    def gauge(self, name: str, documentation: str, labels: tuple = (), callback: Callable = None) -> Gauge:
+        return self._register(Gauge(name, documentation, labels, callback))
+
+    def histogram(
+        self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,299 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+from telebot.asyncio_storage import StateMemoryStorage, StateStorageBase
+from telebot.asyncio_storage.base_storage import StateContext
+
+from .config import settings
+from .database import BotState, session_scope
+
+logger = logging.getLogger(__name__)
+
+
+class PersistentStateStorage(StateStorageBase):
+    """
+    Base class for state storages shared between bot processes.
+
+    Subclasses store one record ``{"state": ..., "data": {...}}`` per chat and
+    user. Reads go through a small in-process cache with a short TTL: the
+    state filter asks for the state once per state handler, and the cache
+    keeps that to one backend round trip per update while staying fresh
+    enough for several replicas.
+    """
+
+    def __init__(self, cache_ttl: float, cache_size: int = 1000):
+        super().__init__()
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # (chat_id, user_id) -> (record, expires at)
+
+    async def _load(self, chat_id, user_id):
+        raise NotImplementedError
+
+    async def close(self):
+        """Release backend connections."""
+
+    async def _store(self, chat_id, user_id, record: dict):
+        raise NotImplementedError
+
+    async def _delete(self, chat_id, user_id) -> bool:
+        raise NotImplementedError
+
+    async def _get(self, chat_id, user_id):
+        key = (chat_id, user_id)
+        cached = self._cache.get(key)
+        if cached is not None and cached[1] > time.monotonic():
+            self._cache.move_to_end(key)
+            return cached[0]
+        record = await self._load(chat_id, user_id)
+        self._remember(key, record)
+        return record
+
+    async def _put(self, chat_id, user_id, record: dict):
+        await self._store(chat_id, user_id, record)
+        self._remember((chat_id, user_id), record)
+
+    def _remember(self, key, record):
+        self._cache[key] = (record, time.monotonic() + self.cache_ttl)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def set_state(self, chat_id, user_id, state):
+        if hasattr(state, 'name'):
+            state = state.name
+        record = await self._get(chat_id, user_id)
+        data = record["data"] if record else {}
+        await self._put(chat_id, user_id, {"state": state, "data": data})
+        return True
+
+    async def delete_state(self, chat_id, user_id):
+        self._remember((chat_id, user_id), None)
+        return await self._delete(chat_id, user_id)
+
+    async def get_state(self, chat_id, user_id):
+        record = await self._get(chat_id, user_id)
+        return record["state"] if record else None
+
+    async def get_data(self, chat_id, user_id):
+        record = await self._get(chat_id, user_id)
+        return record["data"] if record else None
+
+    async def reset_data(self, chat_id, user_id):
+        record = await self._get(chat_id, user_id)
+        if not record:
+            return False
+        await self._put(chat_id, user_id, {"state": record["state"], "data": {}})
+        return True
+
+    async def set_data(self, chat_id, user_id, key, value):
+        record = await self._get(chat_id, user_id)
+        if not record:
+            raise RuntimeError('chat_id {} and user_id {} does not exist'.format(chat_id, user_id))
+        data = dict(record["data"])
+        data[key] = value
+        await self._put(chat_id, user_id, {"state": record["state"], "data": data})
+        return True
+
+    def get_interactive_data(self, chat_id, user_id):
+        return StateContext(self, chat_id, user_id)
+
+    async def save(self, chat_id, user_id, data):
+        record = await self._get(chat_id, user_id)
+        state = record["state"] if record else None
+        await self._put(chat_id, user_id, {"state": state, "data": data})
+
+
+class SQLStateStorage(PersistentStateStorage):
+    """State storage in the application database; queries run in a worker thread."""
+
+    def __init__(self, ttl: int, cache_ttl: float):
+        """
+        Args:
+            ttl (int): Seconds after the last change when a state is considered abandoned
+            cache_ttl (float): Lifetime of in-process cache entries in seconds
+        """
+        super().__init__(cache_ttl)
+        self.ttl = timedelta(seconds=ttl)
+        self._last_cleanup = datetime.min
+
+    async def _load(self, chat_id, user_id):
+        return await asyncio.to_thread(self._load_sync, chat_id, user_id)
+
+    def _load_sync(self, chat_id, user_id):
+        with session_scope() as db:
+            row = db.get(BotState, (chat_id, user_id))
+            if row is None:
+                return None
+            if datetime.utcnow() - row.updated_at > self.ttl:
+                db.delete(row)
+                return None
+            return {"state": row.state, "data": json.loads(row.data)}
+
+    async def _store(self, chat_id, user_id, record: dict):
+        await asyncio.to_thread(self._store_sync, chat_id, user_id, record)
+
+    def _store_sync(self, chat_id, user_id, record: dict):
+        now = datetime.utcnow()
+        with session_scope() as db:
+            db.merge(BotState(
+                chat_id=chat_id,
+                user_id=user_id,
+                state=record["state"],
+                data=json.dumps(record["data"]),
+                updated_at=now,
+            ))
+            # Периодически удаляем брошенные состояния
+            if now - self._last_cleanup > self.ttl:
+                db.query(BotState).filter(BotState.updated_at < now - self.ttl).delete()
+                self._last_cleanup = now
+
+    async def _delete(self, chat_id, user_id) -> bool:
+        return await asyncio.to_thread(self._delete_sync, chat_id, user_id)
+
+    @staticmethod
+    def _delete_sync(chat_id, user_id) -> bool:
+        with session_scope() as db:
+            deleted = db.query(BotState).filter(
+                BotState.chat_id == chat_id, BotState.user_id == user_id
+            ).delete()
+            return bool(deleted)
+
+
+class RedisError(Exception):
+    """Error reply from a Redis-protocol server."""
+
+
+class RedisConnection:
+    """Minimal client for the Redis serialization protocol (RESP)."""
+
+    def __init__(self, url: str):
+        """
+        Args:
+            url (str): Server URL, e.g. ``redis://:password@localhost:6379/0``
+        """
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self._reader = None
+        self._writer = None
+        self._lock = asyncio.Lock()
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            await self._call("AUTH", self.password)
+        if self.db:
+            await self._call("SELECT", self.db)
+
+    async def _call(self, *args):
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            value = str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(value), value))
+        self._writer.write(b"".join(parts))
+        await self._writer.drain()
+        return await self._read_reply()
+
+    async def _read_reply(self):
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RedisError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = await self._reader.readexactly(length + 2)
+            return data[:-2].decode()
+        if kind == b"*":
+            length = int(payload)
+            if length < 0:
+                return None
+            return [await self._read_reply() for _ in range(length)]
+        raise RedisError(f"Unexpected reply: {line!r}")
+
+    async def execute(self, *args):
+        """Send a command and return the decoded reply, reconnecting once on connection errors."""
+        async with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._writer is None:
+                        await self._connect()
+                    return await self._call(*args)
+                except (ConnectionError, asyncio.IncompleteReadError, OSError):
+                    await self._close()
+                    if attempt:
+                        raise
+
+    async def _close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except Exception:
+                pass
+        self._reader = self._writer = None
+
+    async def close(self):
+        async with self._lock:
+            await self._close()
+
+
+class RedisStateStorage(PersistentStateStorage):
+    """State storage in Redis or any server speaking the Redis protocol."""
+
+    def __init__(self, url: str, ttl: int, cache_ttl: float, prefix: str = "jira_bot:state"):
+        """
+        Args:
+            url (str): Server URL
+            ttl (int): Seconds after the last change when a state expires
+            cache_ttl (float): Lifetime of in-process cache entries in seconds
+            prefix (str): Key prefix
+        """
+        super().__init__(cache_ttl)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.redis = RedisConnection(url)
+
+    def _key(self, chat_id, user_id) -> str:
+        return f"{self.prefix}:{chat_id}:{user_id}"
+
+    async def _load(self, chat_id, user_id):
+        value = await self.redis.execute("GET", self._key(chat_id, user_id))
+        return json.loads(value) if value is not None else None
+
+    async def _store(self, chat_id, user_id, record: dict):
+        await self.redis.execute("SET", self._key(chat_id, user_id), json.dumps(record), "EX", self.ttl)
+
+    async def _delete(self, chat_id, user_id) -> bool:
+        return bool(await self.redis.execute("DEL", self._key(chat_id, user_id)))
+
+    async def close(self):
+        await self.redis.close()
+
+
+def create_state_storage() -> StateStorageBase:
+    """Create the state storage selected by STATE_STORAGE: memory, sql or redis."""
+    if settings.STATE_STORAGE == "sql":
+        return SQLStateStorage(ttl=settings.STATE_TTL, cache_ttl=settings.STATE_CACHE_TTL)
+    if settings.STATE_STORAGE == "redis":
+        return RedisStateStorage(
+            settings.REDIS_URL, ttl=settings.STATE_TTL, cache_ttl=settings.STATE_CACHE_TTL
+        )
+    if settings.STATE_STORAGE != "memory":
+        logger.warning(f"Unknown STATE_STORAGE {settings.STATE_STORAGE}, using memory storage")
+    return StateMemoryStorage()
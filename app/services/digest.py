@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+
+from app.core.config import settings
+from sqlalchemy.exc import IntegrityError
+
+from app.core.database import DigestDelivery, DigestSubscription, User, session_scope
+from app.core.metrics import metrics
+from app.services.jira import JiraService, next_report_boundary
+from app.services.jobs import Job, QueueFullError
+from app.services.neuro import cached_summary, llm_queue, summarize
+from app.services.worklog_store import worklog_store
+from app.utils.helpers import worklog_to_prompts
+
+logger = logging.getLogger(__name__)
+
+DIGEST_REPORTS = metrics.counter("digest_reports_total", "Precomputed worklog reports.", ("result",))
+
+# Доставка отчета: (chat_id, ворклоги, краткий отчет нейросети или None)
+Deliver = Callable[[int, dict, Optional[str]], Awaitable]
+
+
+class DigestScheduler:
+    """
+    Precomputes worklog reports of all users shortly before each reporting boundary.
+
+    Worklogs of every user with a token are synced into the local store, so the
+    interactive /worklog only catches up with the few changes made since. For
+    users who opted in, the report is delivered proactively and, if requested,
+    the neuro summary is generated into the LLM cache first. The shared
+    worklog feed is read once per run, before the users are processed. Start times are
+    spread over a window and only a few users are processed at once. When
+    several replicas run, each report is sent by the one that claims it first.
+    """
+
+    def __init__(self, lead: float, window: float, concurrency: int):
+        """
+        Args:
+            lead (float): Seconds before the boundary when precomputation starts
+            window (float): Seconds over which the start times of users are spread
+            concurrency (int): Number of users processed at the same time
+        """
+        self.lead = lead
+        self.window = window
+        self.concurrency = concurrency
+
+    async def subscribe(self, telegram_id: int, chat_id: int, neuro: bool):
+        """Enable proactive delivery of the report to the chat."""
+        await asyncio.to_thread(self._subscribe, telegram_id, chat_id, neuro)
+
+    @staticmethod
+    def _subscribe(telegram_id: int, chat_id: int, neuro: bool):
+        with session_scope() as db:
+            subscription = db.get(DigestSubscription, telegram_id)
+            if subscription is None:
+                subscription = DigestSubscription(telegram_id=telegram_id, created_at=datetime.utcnow())
+                db.add(subscription)
+            subscription.chat_id = chat_id
+            subscription.neuro = neuro
+
+    async def unsubscribe(self, telegram_id: int) -> bool:
+        """Disable proactive delivery. Returns False if it was not enabled."""
+        return await asyncio.to_thread(self._unsubscribe, telegram_id)
+
+    @staticmethod
+    def _unsubscribe(telegram_id: int) -> bool:
+        with session_scope() as db:
+            return bool(
+                db.query(DigestSubscription).filter(DigestSubscription.telegram_id == telegram_id).delete()
+            )
+
+    async def run(self, deliver: Deliver):
+        """Precompute reports before every boundary until cancelled."""
+        boundary = next_report_boundary(datetime.now())
+        while True:
+            try:
+                delay = (boundary - timedelta(seconds=self.lead) - datetime.now()).total_seconds()
+                if delay > 0:
+                    logger.info(f"Next worklog digest run in {delay:.0f} s, before {boundary:%Y-%m-%d %H:%M}")
+                    await asyncio.sleep(delay)
+                # Разброс стартов заканчивается до границы периода
+                spread = max(0.0, min(self.window, (boundary - datetime.now()).total_seconds()))
+                await self.run_once(deliver, spread, boundary)
+            except Exception:
+                # Сбой одного запуска не должен останавливать рассылку до перезапуска бота
+                logger.exception(f"Worklog digest run before {boundary:%Y-%m-%d %H:%M} failed")
+            boundary = next_report_boundary(boundary)
+
+    async def run_once(self, deliver: Deliver, spread: float = 0.0, boundary: datetime = None):
+        """
+        Precompute reports of all users, starting each one at a random moment within `spread` seconds.
+
+        Reports are delivered for the period ending at `boundary` (the next one by default).
+        """
+        boundary = boundary or next_report_boundary(datetime.now())
+        users, subscriptions = await asyncio.to_thread(self._load_users, boundary)
+        logger.info(f"Precomputing worklog digests of {len(users)} users")
+        await self._sync_feed(users)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def process(telegram_id: int, token: str):
+            await asyncio.sleep(random.uniform(0, spread))
+            async with semaphore:
+                try:
+                    await self.precompute(telegram_id, token, subscriptions.get(telegram_id), deliver, boundary)
+                    DIGEST_REPORTS.inc(result="ok")
+                except Exception as e:
+                    DIGEST_REPORTS.inc(result="error")
+                    logger.warning(f"Error precomputing worklog digest of user {telegram_id}: {e}")
+
+        await asyncio.gather(*(process(telegram_id, token) for telegram_id, token in users))
+
+    @staticmethod
+    def _load_users(boundary: datetime) -> tuple:
+        """Users with a token and subscriptions by Telegram id; drops claims of past periods."""
+        with session_scope() as db:
+            # Отметки прошлых периодов больше не нужны
+            db.query(DigestDelivery).filter(DigestDelivery.boundary < boundary).delete()
+            users = [
+                (user.telegram_id, user.jira_token)
+                for user in db.query(User).filter(User.jira_token.isnot(None))
+            ]
+            subscriptions = {
+                subscription.telegram_id: (subscription.chat_id, subscription.neuro)
+                for subscription in db.query(DigestSubscription)
+            }
+        return users, subscriptions
+
+    @staticmethod
+    async def _sync_feed(users: list):
+        """Read the shared worklog feed once, with the first token that works."""
+        for telegram_id, token in users:
+            try:
+                await worklog_store.sync_feed(JiraService(token=token))
+                return
+            except Exception as e:
+                logger.warning(f"Error syncing worklog feed with the token of user {telegram_id}: {e}")
+
+    async def precompute(
+        self, telegram_id: int, token: str, subscription: Optional[tuple], deliver: Deliver, boundary: datetime
+    ):
+        jira = JiraService(token=token)
+        # Общая лента уже прочитана в начале запуска
+        await worklog_store.sync(telegram_id, jira, feed=False)
+        if subscription is None:
+            return
+        if not await asyncio.to_thread(self._claim, telegram_id, boundary):
+            logger.debug(f"Worklog digest of user {telegram_id} before {boundary} is sent by another replica")
+            return
+
+        chat_id, neuro = subscription
+        worklog_entries = await worklog_store.recent_entries(telegram_id)
+        summary = None
+        if neuro and worklog_entries:
+            summary = await self._summarize(telegram_id, worklog_to_prompts(worklog_entries))
+        await deliver(chat_id, worklog_entries, summary)
+
+    @staticmethod
+    def _claim(telegram_id: int, boundary: datetime) -> bool:
+        """Atomically claim delivery of the report for the period. Returns False if already claimed."""
+        try:
+            with session_scope() as db:
+                db.add(DigestDelivery(telegram_id=telegram_id, boundary=boundary, claimed_at=datetime.utcnow()))
+        except IntegrityError:
+            return False
+        return True
+
+    @staticmethod
+    async def _summarize(telegram_id: int, prompts: list) -> Optional[str]:
+        """
+        Generate the neuro summary through the shared LLM queue.
+
+        Returns None if the user already has a request in the queue, the queue is
+        full or the generation failed; otherwise the answer stored in the LLM cache.
+        """
+        summary = await cached_summary(prompts)
+        if summary is not None:
+            return summary
+
+        finished = asyncio.get_running_loop().create_future()
+
+        def finish():
+            if not finished.done():
+                finished.set_result(None)
+
+        async def run():
+            try:
+                await summarize(prompts)
+            finally:
+                finish()
+
+        async def on_cancel():
+            finish()
+
+        try:
+            if llm_queue.submit(Job(telegram_id, run, on_cancel=on_cancel)) is None:
+                return None
+        except QueueFullError:
+            logger.warning(f"LLM queue is full, skipping neuro digest of user {telegram_id}")
+            return None
+        await finished
+        # Удачный ответ попадает в кэш; ошибки и ответы с иероглифами туда не пишутся
+        return await cached_summary(prompts)
+
+
+digest_scheduler = DigestScheduler(
+    lead=settings.DIGEST_LEAD,
+    window=settings.DIGEST_WINDOW,
+    concurrency=settings.DIGEST_CONCURRENCY,
+)
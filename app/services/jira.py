@@ -1,117 +1,695 @@
-from jira import JIRA
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Hashable, Optional
+
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.jira_transport import CircuitBreaker, JiraError, JiraTransport, TokenBucket
 from datetime import datetime, timedelta
 
+
+# Отчеты сдаются в понедельник, среду и пятницу в 14:30
+REPORT_WEEKDAYS = (0, 2, 4)
+REPORT_HOUR, REPORT_MINUTE = 14, 30
+
+
+def next_report_boundary(now: datetime) -> datetime:
+    """Get the first reporting boundary (Mon/Wed/Fri 14:30) after `now`."""
+    for days in range(8):
+        boundary = (now + timedelta(days=days)).replace(
+            hour=REPORT_HOUR, minute=REPORT_MINUTE, second=0, microsecond=0
+        )
+        if boundary.weekday() in REPORT_WEEKDAYS and boundary > now:
+            return boundary
+
+
+def get_worklog_period_days(today: datetime) -> int:
+    """
+    Get the number of days the current reporting period spans.
+
+    Reports cover the time since the previous 14:30 boundary on Monday,
+    Wednesday or Friday.
+    """
+    weekday = today.weekday()  # 0 = понедельник, 6 = воскресенье
+    current_time = today.time()
+    mid_day = datetime.strptime("14:30", "%H:%M").time()
+    
+    # Определяем начальную дату для запроса в зависимости от текущего дня и времени
+    if weekday == 0 and current_time <= mid_day:  # Понедельник до 14:30
+        days = 3  # С пятницы 14:30
+    elif weekday == 0 and current_time > mid_day:  # Понедельник после 14:30
+        days = 0  # С понедельника 14:30
+    elif weekday == 1:  # Вторник
+        days = 1
+    elif weekday == 2 and current_time <= mid_day:  # Среда до 14:30
+        days = 2
+    elif weekday == 2 and current_time > mid_day:  # Среда после 14:30
+        days = 0  # С среды 14:30
+    elif weekday == 3:  # Четверг
+        days = 1
+    elif weekday == 4 and current_time <= mid_day:  # Пятница до 14:30
+        days = 2
+    elif weekday == 4 and current_time > mid_day:  # Пятница после 14:30
+        days = 0  # С пятницы 14:30
+    elif weekday == 5:  # Суббота
+        days = 1
+    else:  # Воскресенье
+        days = 2
+
+    return days
+
+
+class IssueCache:
+    """Short-lived LRU cache of lookups made with a single token.
+
+    JiraClient keeps one instance for issues keyed by issue key and a
+    separate one for workflow transitions keyed by (project, issue type, status).
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        """
+        Args:
+            ttl (float): Lifetime of a cached entry in seconds
+            max_size (int): Maximum number of cached entries
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # key -> (value, expires at)
+
+    def get(self, key: Hashable) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: Hashable, value: dict):
+        self._entries.pop(key, None)
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+
+
+JIRA_COALESCED = metrics.counter(
+    "jira_coalesced_requests_total", "GET requests served by an identical request already in flight."
+)
+
+
+class JiraClient:
+    """Minimal async client for the Jira REST API v2 bound to a single token.
+
+    Identical GET requests in flight are coalesced into one upstream call.
+    Coalescing and the caches are scoped to the client, i.e. to the
+    token: Jira filters responses by the permissions of the token, so an
+    answer fetched for one user is never handed to another.
+    """
+
+    def __init__(
+        self,
+        transport: JiraTransport,
+        token: str,
+        limiter: TokenBucket = None,
+        issues: IssueCache = None,
+        workflow: IssueCache = None,
+    ):
+        """
+        Args:
+            transport (JiraTransport): Shared transport with the connection pool
+            token (str): Personal Jira API token
+            limiter (TokenBucket): Rate limiter of this token
+            issues (IssueCache): Cache of issues fetched with this token
+            workflow (IssueCache): Cache of transitions available to this token, keyed by
+                (project, issue type, status): issues in the same status share the transitions
+        """
+        self.transport = transport
+        self.limiter = limiter
+        self.issues = issues if issues is not None else IssueCache(ttl=0, max_size=0)
+        self.workflow = workflow if workflow is not None else IssueCache(ttl=0, max_size=0)
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self._myself = None
+        self._inflight = {}  # (path, params) -> задача запроса
+
+    async def request(self, method: str, path: str, **kwargs):
+        """Perform a request and return the decoded JSON body."""
+        if method != "GET":
+            return await self._request(method, path, **kwargs)
+
+        key = (path, tuple(sorted((kwargs.get("params") or {}).items())))
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._request(method, path, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._request_done(key, t))
+        else:
+            JIRA_COALESCED.inc()
+        # Отмена одного из ожидающих не должна отменять общий запрос
+        return await asyncio.shield(task)
+
+    def _request_done(self, key, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # ошибку получают ожидающие; иначе asyncio предупредит о ней
+
+    async def _request(self, method: str, path: str, **kwargs):
+        response = await self.transport.request(
+            method, path, limiter=self.limiter, headers=self.headers, **kwargs
+        )
+        if response.status_code >= 400:
+            raise JiraError(response.status_code, self._error_text(response))
+        if not response.content:
+            return None
+        return response.json()
+
+    @staticmethod
+    def _error_text(response) -> str:
+        try:
+            data = response.json()
+        except ValueError:
+            return response.text or response.reason_phrase
+        messages = list(data.get("errorMessages", []))
+        messages.extend(f"{field}: {error}" for field, error in data.get("errors", {}).items())
+        return "; ".join(messages) or response.reason_phrase
+
+    async def myself(self) -> dict:
+        """Get the current user, cached for the lifetime of the client."""
+        if self._myself is None:
+            self._myself = await self.request("GET", "myself")
+        return self._myself
+
+    async def current_user(self) -> str:
+        """Return the `accountId` (Cloud) else `name` of the current user."""
+        myself = await self.myself()
+        return myself.get("accountId") or myself.get("name")
+
+    async def issue(self, issue_key: str, fields: str = None, expand: str = None) -> dict:
+        params = {}
+        if fields:
+            params["fields"] = fields
+        if expand:
+            params["expand"] = expand
+        return await self.request("GET", f"issue/{issue_key}", params=params or None)
+
+    async def search(
+        self, jql: str, start_at: int = 0, max_results: int = 50, fields: str = None, validate_query: str = None
+    ) -> dict:
+        params = {"jql": jql, "startAt": start_at, "maxResults": max_results}
+        if fields:
+            params["fields"] = fields
+        if validate_query:
+            params["validateQuery"] = validate_query
+        return await self.request("GET", "search", params=params)
+
+    async def search_issues(
+        self, jql: str, max_results: int = 50, fields: str = None, validate_query: str = None
+    ) -> list:
+        data = await self.search(jql, max_results=max_results, fields=fields, validate_query=validate_query)
+        return data["issues"]
+
+    async def worklogs(self, issue_key: str) -> list:
+        data = await self.request("GET", f"issue/{issue_key}/worklog")
+        return data["worklogs"]
+
+    async def _worklog_changes(self, path: str, since: int):
+        ids = []
+        while True:
+            data = await self.request("GET", path, params={"since": since})
+            ids.extend(value["worklogId"] for value in data["values"])
+            since = data["until"]
+            if data["lastPage"]:
+                return ids, since
+
+    async def updated_worklogs(self, since: int):
+        """
+        Get ids of worklogs updated since the timestamp.
+
+        Returns:
+            tuple: List of worklog ids and the timestamp to continue from
+        """
+        return await self._worklog_changes("worklog/updated", since)
+
+    async def deleted_worklogs(self, since: int):
+        """
+        Get ids of worklogs deleted since the timestamp.
+
+        Returns:
+            tuple: List of worklog ids and the timestamp to continue from
+        """
+        return await self._worklog_changes("worklog/deleted", since)
+
+    async def worklogs_by_ids(self, ids: list) -> list:
+        """Get worklogs by ids, at most 1000 per request."""
+        worklogs = []
+        for i in range(0, len(ids), 1000):
+            worklogs.extend(await self.request("POST", "worklog/list", json={"ids": ids[i:i + 1000]}))
+        return worklogs
+
+    async def transitions(self, issue_key: str) -> list:
+        data = await self.request("GET", f"issue/{issue_key}/transitions")
+        return data["transitions"]
+
+    async def transition_issue(self, issue_key: str, transition_id: str):
+        await self.request(
+            "POST",
+            f"issue/{issue_key}/transitions",
+            json={"transition": {"id": transition_id}},
+        )
+        self.issues.invalidate(issue_key)
+
+
+class JiraClientRegistry:
+    """LRU registry of Jira clients keyed by token hash.
+
+    All clients share one transport with the connection pool; the registry
+    keeps per-token state such as the cached current user and the rate
+    limiter alive between commands.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        idle_ttl: float,
+        transport: JiraTransport,
+        token_rate: float,
+        token_burst: float,
+        issue_ttl: float,
+        issue_cache_size: int,
+        transition_ttl: float,
+        transition_cache_size: int,
+    ):
+        """
+        Args:
+            max_size (int): Maximum number of cached clients
+            idle_ttl (float): Seconds of inactivity after which a client is dropped
+            transport (JiraTransport): Transport shared by all clients
+            token_rate (float): Requests per second allowed for a single token
+            token_burst (float): Burst size for a single token
+            issue_ttl (float): Lifetime of cached issues in seconds
+            issue_cache_size (int): Maximum number of cached issues per token
+            transition_ttl (float): Lifetime of cached workflow transitions in seconds
+            transition_cache_size (int): Maximum number of cached transition sets per token
+        """
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self.transport = transport
+        self.token_rate = token_rate
+        self.token_burst = token_burst
+        self.issue_ttl = issue_ttl
+        self.issue_cache_size = issue_cache_size
+        self.transition_ttl = transition_ttl
+        self.transition_cache_size = transition_cache_size
+        self._clients = OrderedDict()  # token hash -> (client, last used)
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def _evict(self, now: float):
+        # Удаляем давно не использовавшиеся клиенты и лишние по LRU
+        while self._clients:
+            key, (_, last_used) = next(iter(self._clients.items()))
+            if len(self._clients) <= self.max_size and now - last_used <= self.idle_ttl:
+                break
+            del self._clients[key]
+
+    def get(self, token: str) -> JiraClient:
+        """Return a cached client for the token, creating it if needed."""
+        key = self._key(token)
+        now = time.monotonic()
+        self._evict(now)
+        entry = self._clients.pop(key, None)
+        if entry is not None:
+            client = entry[0]
+        else:
+            client = JiraClient(
+                self.transport,
+                token,
+                limiter=TokenBucket(self.token_rate, self.token_burst),
+                issues=IssueCache(self.issue_ttl, self.issue_cache_size),
+                workflow=IssueCache(self.transition_ttl, self.transition_cache_size),
+            )
+        self._clients[key] = (client, now)
+        self._evict(now)
+        return client
+
+    def invalidate(self, token: str):
+        """Drop the cached client for the token."""
+        if not token:
+            return
+        self._clients.pop(self._key(token), None)
+
+    async def aclose(self):
+        """Close the shared connection pool."""
+        self._clients.clear()
+        await self.transport.aclose()
+
+
+jira_clients = JiraClientRegistry(
+    max_size=settings.JIRA_CLIENT_CACHE_SIZE,
+    idle_ttl=settings.JIRA_CLIENT_IDLE_TTL,
+    transport=JiraTransport(
+        pool_maxsize=settings.JIRA_POOL_MAXSIZE,
+        rate=settings.JIRA_RATE_LIMIT,
+        burst=settings.JIRA_RATE_BURST,
+        max_retries=settings.JIRA_MAX_RETRIES,
+        backoff=settings.JIRA_RETRY_BACKOFF,
+        max_delay=settings.JIRA_RETRY_MAX_DELAY,
+        breaker=CircuitBreaker(settings.JIRA_BREAKER_THRESHOLD, settings.JIRA_BREAKER_COOLDOWN),
+    ),
+    token_rate=settings.JIRA_TOKEN_RATE_LIMIT,
+    token_burst=settings.JIRA_TOKEN_RATE_BURST,
+    issue_ttl=settings.ISSUE_CACHE_TTL,
+    issue_cache_size=settings.ISSUE_CACHE_SIZE,
+    transition_ttl=settings.TRANSITION_CACHE_TTL,
+    transition_cache_size=settings.TRANSITION_CACHE_SIZE,
+)
+metrics.gauge("jira_clients", "Cached per-token Jira clients.", callback=lambda: len(jira_clients))
+metrics.gauge(
+    "jira_circuit_open", "1 while the Jira circuit breaker rejects requests.",
+    callback=lambda: int(jira_clients.transport.breaker.state == "open"),
+)
+
+
+# Поля задачи, которые показываются пользователю
+ISSUE_FIELDS = "summary,status"
+# Поля задачи, от которых зависят доступные переходы
+WORKFLOW_FIELDS = "project,issuetype,status"
+
+# Результаты смены статуса, кроме текста ошибки Jira
+NOT_FOUND = "not_found"
+NO_TRANSITION = "no_transition"
+
+
 class JiraService:
     def __init__(self, token: str):
         """
-        Initialize Jira client with token.
+        Initialize Jira service with a pooled client for the token.
         
         Args:
             token (str): Personal Jira API token
         """
-        self.client = JIRA(
-            server=settings.JIRA_URL,
-            token_auth=token
-        )
+        self.client = jira_clients.get(token)
+
+    async def get_issue(self, issue_key: str) -> dict:
+        """Get issue by key with the fields shown to the user."""
+        issue = self.client.issues.get(issue_key)
+        if issue is None:
+            issue = await self.client.issue(issue_key, fields=ISSUE_FIELDS)
+            self.client.issues.put(issue_key, issue)
+        return issue
 
-    def get_issue(self, issue_key: str):
-        """Get issue by key."""
-        return self.client.issue(issue_key)
+    async def get_issues(self, issue_keys: list) -> dict:
+        """
+        Get several issues by key with one `key in (...)` search.
+
+        Keys that do not exist or are not visible with the token are absent
+        from the result instead of failing the whole request.
 
-    def get_issues_in_status(self, status: str, project: str = None):
+        Returns:
+            dict: Requested issue key -> issue, in the order of `issue_keys`
+        """
+        found = {}
+        missing = []
+        for key in issue_keys:
+            issue = self.client.issues.get(key)
+            if issue is None:
+                missing.append(key)
+            else:
+                found[key] = issue
+
+        if len(missing) == 1:
+            try:
+                found[missing[0]] = await self.get_issue(missing[0])
+            except JiraError as e:
+                if e.status_code != 404:
+                    raise
+        elif missing:
+            # validateQuery=warn: несуществующие ключи не делают весь запрос ошибочным
+            issues = await self.client.search_issues(
+                f"key in ({', '.join(missing)})",
+                max_results=len(missing),
+                fields=ISSUE_FIELDS,
+                validate_query="warn",
+            )
+            by_key = {issue["key"]: issue for issue in issues}
+            for key in missing:
+                issue = by_key.get(key)
+                if issue is not None:
+                    self.client.issues.put(key, issue)
+                    found[key] = issue
+
+        return {key: found[key] for key in issue_keys if key in found}
+
+    async def search_pages(
+        self,
+        jql: str,
+        fields: str = ISSUE_FIELDS,
+        page_size: int = settings.JIRA_SEARCH_PAGE_SIZE,
+        validate_query: str = None,
+    ) -> AsyncIterator[list]:
+        """
+        Search issues page by page.
+
+        The next page is requested while the caller processes the current one,
+        so at most two pages are held in memory. The offset of the next page is
+        the number of issues actually returned, so nothing is skipped when Jira
+        returns fewer issues than requested.
+
+        Args:
+            jql (str): JQL query
+            fields (str): Comma-separated issue fields to return
+            page_size (int): Issues per request
+            validate_query (str): validateQuery mode, e.g. "warn" to ignore unknown keys
+
+        Yields:
+            list: Non-empty page of issues
+        """
+        async def fetch(start_at):
+            return await self.client.search(
+                jql, start_at=start_at, max_results=page_size, fields=fields, validate_query=validate_query
+            )
+
+        start_at = 0
+        next_page = asyncio.ensure_future(fetch(start_at))
+        try:
+            while next_page is not None:
+                data = await next_page
+                issues = data["issues"]
+                start_at += len(issues)
+                more = issues and start_at < data["total"]
+                next_page = asyncio.ensure_future(fetch(start_at)) if more else None
+                if issues:
+                    yield issues
+        finally:
+            # Потребитель остановился раньше: следующая страница больше не нужна
+            if next_page is not None:
+                next_page.cancel()
+                await asyncio.gather(next_page, return_exceptions=True)
+
+    async def iter_issues(
+        self, jql: str, fields: str = ISSUE_FIELDS, page_size: int = settings.JIRA_SEARCH_PAGE_SIZE
+    ) -> AsyncIterator[dict]:
+        """Search issues one by one, see `search_pages`."""
+        async for issues in self.search_pages(jql, fields, page_size):
+            for issue in issues:
+                yield issue
+
+    async def get_issues_in_status(self, status: str, project: str = None, fields: str = ISSUE_FIELDS) -> list:
         """Get all issues in specific status."""
         jql = f"status = '{status}'"
         if project:
             jql += f" AND project = {project}"
-        return self.client.search_issues(jql)
+        return [issue async for issue in self.iter_issues(jql, fields)]
 
-    def update_issue_status(self, issue_key: str, status_name: str):
+    async def update_issue_status(self, issue_key: str, status_name: str) -> bool:
         """Update issue status."""
-        issue = self.get_issue(issue_key)
-        transitions = self.client.transitions(issue)
-        for t in transitions:
-            if t['name'].lower() == status_name.lower():
-                self.client.transition_issue(issue, t['id'])
+        issue = await self.client.issue(issue_key, fields=WORKFLOW_FIELDS)
+        return await self._move(issue, status_name)
+
+    async def update_issues_status(self, issue_keys: list, status_name: str) -> dict:
+        """
+        Move several issues to the status concurrently.
+
+        The issues are found with one paged search, transitions are resolved
+        once per (project, issue type, status) and the transitions themselves
+        run with at most JIRA_TRANSITION_WORKERS requests in parallel.
+
+        Returns:
+            dict: Issue key -> None if the issue was moved, otherwise NOT_FOUND,
+                NO_TRANSITION or the error text, in the order of `issue_keys`
+        """
+        issue_keys = list(dict.fromkeys(issue_keys))
+        issues = {}
+        jql = f"key in ({', '.join(issue_keys)})"
+        # validateQuery=warn: несуществующие ключи не делают весь запрос ошибочным
+        async for page in self.search_pages(jql, fields=WORKFLOW_FIELDS, validate_query="warn"):
+            issues.update((issue["key"], issue) for issue in page)
+
+        # Заполняем кэш переходов по одной задаче на каждую схему, а не по всем сразу
+        groups = {}
+        for issue in issues.values():
+            groups.setdefault(self._workflow_key(issue), issue)
+        await asyncio.gather(*(self._transitions(issue) for issue in groups.values()), return_exceptions=True)
+
+        semaphore = asyncio.Semaphore(settings.JIRA_TRANSITION_WORKERS)
+
+        async def move(issue_key):
+            issue = issues.get(issue_key)
+            if issue is None:
+                return NOT_FOUND
+            try:
+                async with semaphore:
+                    return None if await self._move(issue, status_name) else NO_TRANSITION
+            except JiraError as e:
+                return e.text
+            except Exception as e:
+                # Ошибка одной задачи (например, сетевая) не должна терять результаты остальных
+                return str(e) or type(e).__name__
+
+        results = await asyncio.gather(*(move(key) for key in issue_keys))
+        return dict(zip(issue_keys, results))
+
+    @staticmethod
+    def _workflow_key(issue: dict) -> tuple:
+        fields = issue["fields"]
+        return fields["project"]["key"], fields["issuetype"]["name"], fields["status"]["name"]
+
+    async def _transitions(self, issue: dict, refresh: bool = False) -> dict:
+        """
+        Get transitions available for the issue from its current status.
+
+        Returns:
+            dict: Lowercased transition name or target status name -> transition id
+        """
+        transitions = None if refresh else self.client.workflow.get(self._workflow_key(issue))
+        if transitions is None:
+            # Статус и переходы одним запросом, чтобы они соответствовали друг другу
+            current = await self.client.issue(issue["key"], fields=WORKFLOW_FIELDS, expand="transitions")
+            transitions = {}
+            for t in current["transitions"]:
+                transitions.setdefault(t["name"].lower(), t["id"])
+            for t in current["transitions"]:
+                transitions.setdefault(t["to"]["name"].lower(), t["id"])
+            self.client.workflow.put(self._workflow_key(current), transitions)
+        return transitions
+
+    async def _move(self, issue: dict, status_name: str) -> bool:
+        for refresh in (False, True):
+            transition_id = (await self._transitions(issue, refresh)).get(status_name.lower())
+            if transition_id is None:
+                # В кэше может быть схема до изменения: перед отказом проверяем свежие переходы
+                continue
+            try:
+                await self.client.transition_issue(issue["key"], transition_id)
                 return True
+            except JiraError as e:
+                # Переход из кэша устарел: изменилась схема или статус задачи
+                if refresh or e.status_code != 400:
+                    raise
         return False
 
-    def test_connection(self) -> bool:
+    async def test_connection(self) -> bool:
         """Test if the Jira connection is working."""
         try:
-            self.client.myself()
+            await self.client.myself()
             return True
         except Exception:
             return False
 
-    def get_recent_worklog(self, days: int = 3) -> dict:
+    async def get_team_worklog(self, authors: list) -> dict:
         """
-        Get worklog entries for the current user based on current time period.
-        
+        Get worklog entries of several users for the current time period.
+
+        One paged `worklogAuthor in (...)` search finds the issues of the whole team and
+        worklogs are fetched once per issue, so the cost depends on the number of
+        distinct issues rather than on the team size.
+
+        Args:
+            authors (list): Jira user names (Server) or account ids (Cloud)
+
         Returns:
-            dict: Dictionary with issue keys as keys and worklog entries as values
+            dict: Author -> dictionary with issue keys as keys and worklog entries as values;
+                authors without worklogs have an empty dictionary
         """
         today = datetime.now()
-        weekday = today.weekday()  # 0 = понедельник, 6 = воскресенье
-        current_time = today.time()
-        mid_day = datetime.strptime("14:30", "%H:%M").time()
-        
-        # Определяем начальную дату для запроса в зависимости от текущего дня и времени
-        if weekday == 0 and current_time <= mid_day:  # Понедельник до 14:30
-            days = 3  # С пятницы 14:30
-        elif weekday == 0 and current_time > mid_day:  # Понедельник после 14:30
-            days = 0  # С понедельника 14:30
-        elif weekday == 1:  # Вторник
-            days = 1
-        elif weekday == 2 and current_time <= mid_day:  # Среда до 14:30
-            days = 2
-        elif weekday == 2 and current_time > mid_day:  # Среда после 14:30
-            days = 0  # С среды 14:30
-        elif weekday == 3:  # Четверг
-            days = 1
-        elif weekday == 4 and current_time <= mid_day:  # Пятница до 14:30
-            days = 2
-        elif weekday == 4 and current_time > mid_day:  # Пятница после 14:30
-            days = 0  # С пятницы 14:30
-        elif weekday == 5:  # Суббота
-            days = 1
-        else:  # Воскресенье
-            days = 2
-
-        # Формируем JQL запрос для поиска всех задач с журналом работ пользователя
-        jql_query = f"worklogAuthor = currentUser() AND worklogDate >= startOfDay(-{days})"
-
-        # Получаем задачи
-        issues = self.client.search_issues(jql_query, maxResults=100)
-
-        worklog_entries = {}
+        days = get_worklog_period_days(today)
         days_ago = today - timedelta(days=days)
 
-        # Обрабатываем каждую задачу
+        quoted = ", ".join(f'"{author}"' for author in authors)
+        jql = f"worklogAuthor in ({quoted}) AND worklogDate >= startOfDay(-{days})"
+
+        team_entries = {author: {} for author in authors}
+        async for issues in self.search_pages(jql, fields="summary,worklog"):
+            worklogs_by_issue = await self._issue_worklogs(issues)
+            for issue in issues:
+                for worklog in worklogs_by_issue[issue["key"]]:
+                    author = next((a for a in authors if self._is_author(worklog["author"], a)), None)
+                    if author is None:
+                        continue
+                    worklog_date = datetime.strptime(worklog["started"][:10], "%Y-%m-%d")
+                    if worklog_date.date() < days_ago.date():
+                        continue
+                    team_entries[author].setdefault(issue["key"], []).append(self._worklog_entry(issue, worklog))
+
+        for worklog_entries in team_entries.values():
+            for entries in worklog_entries.values():
+                entries.sort(key=lambda x: x["date"], reverse=True)
+        return team_entries
+
+    async def _issue_worklogs(self, issues: list) -> dict:
+        """
+        Get worklogs of the issues found by a search with the `worklog` field.
+
+        Returns:
+            dict: Issue key -> list of worklogs
+        """
+        # Встроенный журнал работ обрезается Jira (обычно до 20 записей),
+        # для таких задач догружаем журнал отдельно и параллельно
+        worklogs_by_issue = {}
+        truncated = []
         for issue in issues:
-            worklogs = self.client.worklogs(issue.key)
-
-            for worklog in worklogs:
-                worklog_date = datetime.strptime(worklog.started[:10], "%Y-%m-%d")
-
-                if worklog_date.date() >= days_ago.date():
-                    if issue.key not in worklog_entries:
-                        worklog_entries[issue.key] = []
-
-                    worklog_entries[issue.key].append({
-                        "issue_key": issue.key,
-                        "issue_summary": issue.fields.summary,
-                        "date": worklog.started,
-                        "time_spent": worklog.timeSpent,
-                        "time_spent_seconds": worklog.timeSpentSeconds,
-                        "comment": worklog.comment,
-                        "author": worklog.author.displayName,
-                        "created": worklog.created,
-                        "updated": worklog.updated,
-                    })
-
-        # Сортируем записи по дате
-        for key in worklog_entries:
-            worklog_entries[key].sort(key=lambda x: x["date"], reverse=True)
-
-        return worklog_entries
+            embedded = issue["fields"]["worklog"]
+            if embedded["total"] > len(embedded["worklogs"]):
+                truncated.append(issue["key"])
+            else:
+                worklogs_by_issue[issue["key"]] = embedded["worklogs"]
+
+        if truncated:
+            semaphore = asyncio.Semaphore(settings.JIRA_WORKLOG_WORKERS)
+
+            async def fetch(issue_key):
+                async with semaphore:
+                    return await self.client.worklogs(issue_key)
+
+            results = await asyncio.gather(*(fetch(key) for key in truncated))
+            worklogs_by_issue.update(zip(truncated, results))
+        return worklogs_by_issue
+
+    @staticmethod
+    def _worklog_entry(issue: dict, worklog: dict) -> dict:
+        return {
+            "issue_key": issue["key"],
+            "issue_summary": issue["fields"]["summary"],
+            "date": worklog["started"],
+            "time_spent": worklog["timeSpent"],
+            "time_spent_seconds": worklog["timeSpentSeconds"],
+            "comment": worklog.get("comment", ""),
+            "author": worklog["author"]["displayName"],
+            "created": worklog["created"],
+            "updated": worklog["updated"],
+        }
+
+    @staticmethod
+    def _is_author(author: dict, user_id: str) -> bool:
+        """Check whether the worklog author is the given user (accountId on Cloud, name on Server)."""
+        return user_id in (author.get("accountId"), author.get("name"))
@@ -0,0 +1,289 @@
+import asyncio
+import logging
+import random
+import re
+import time
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING, Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+JIRA_REQUESTS = metrics.counter(
+    "jira_requests_total", "Requests to the Jira REST API.", ("method", "endpoint", "status")
+)
+JIRA_REQUEST_DURATION = metrics.histogram(
+    "jira_request_duration_seconds", "Duration of Jira REST API requests.", ("method", "endpoint")
+)
+JIRA_RETRIES = metrics.counter("jira_retries_total", "Retried Jira requests.", ("reason",))
+JIRA_RATE_LIMIT_WAIT = metrics.histogram(
+    "jira_rate_limit_wait_seconds", "Time requests wait for the Jira rate limiter."
+)
+
+# Ответы, после которых запрос можно повторить
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+def jira_endpoint(path: str) -> str:
+    """Path of a request with the issue key replaced, used as a metric label."""
+    return re.sub(r"^issue/[^/]+", "issue/{key}", path)
+
+
+class JiraError(Exception):
+    """Error response from the Jira REST API."""
+
+    def __init__(self, status_code: int, text: str):
+        super().__init__(f"{status_code}: {text}")
+        self.status_code = status_code
+        self.text = text
+
+
+class JiraUnavailableError(JiraError):
+    """Raised without calling Jira while the circuit breaker is open."""
+
+    def __init__(self, retry_in: float):
+        super().__init__(503, f"Jira is temporarily unavailable, retry in {retry_in:.0f} s")
+        self.retry_in = retry_in
+
+
+class TokenBucket:
+    """Token bucket rate limiter.
+
+    Tokens are reserved on acquire, so concurrent callers are served in
+    arrival order and each one sleeps until its own token is available.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Args:
+            rate (float): Tokens added per second
+            capacity (float): Maximum burst size
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Take a token and return how long the caller has to wait for it."""
+        self._refill(time.monotonic())
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+    async def acquire(self) -> float:
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+        return delay
+
+    def pause(self, seconds: float):
+        """Hold back all callers for the given time, e.g. after a Retry-After."""
+        self._refill(time.monotonic())
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+class CircuitBreaker:
+    """Stops calling Jira after consecutive failures.
+
+    After `threshold` failures in a row the breaker opens for `cooldown`
+    seconds; then a single trial request is let through (half-open) and its
+    outcome closes or reopens the breaker.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return "open"
+        return "half_open"
+
+    def before_request(self):
+        """Raises JiraUnavailableError if the request must not be sent."""
+        state = self.state
+        if state == "open" or (state == "half_open" and self._trial):
+            retry_in = max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+            raise JiraUnavailableError(retry_in)
+        if state == "half_open":
+            self._trial = True
+
+    def success(self):
+        if self.opened_at is not None:
+            logger.info("Jira circuit breaker is closed")
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def cancelled(self):
+        """The request was cancelled before its outcome was known."""
+        self._trial = False
+
+    def failure(self):
+        self.failures += 1
+        if self._trial or self.failures >= self.threshold:
+            if self.opened_at is None or self._trial:
+                logger.warning(f"Jira circuit breaker is open after {self.failures} failures")
+            self.opened_at = time.monotonic()
+            self._trial = False
+
+
+class JiraTransport:
+    """HTTP layer under the Jira clients: connection pool, global rate limit,
+    retries with backoff and a circuit breaker shared by all tokens."""
+
+    def __init__(
+        self,
+        pool_maxsize: int,
+        rate: float,
+        burst: float,
+        max_retries: int,
+        backoff: float,
+        max_delay: float,
+        breaker: CircuitBreaker,
+    ):
+        """
+        Args:
+            pool_maxsize (int): Maximum number of pooled connections to Jira
+            rate (float): Global limit of requests per second
+            burst (float): Global burst size
+            max_retries (int): Retries of a failed request
+            backoff (float): Base delay of the exponential backoff in seconds
+            max_delay (float): Longest delay worth waiting; a longer Retry-After fails the request
+            breaker (CircuitBreaker): Circuit breaker shared by all requests
+        """
+        self.pool_maxsize = pool_maxsize
+        self.limiter = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.breaker = breaker
+        self._http = None
+
+    @property
+    def http(self) -> "httpx.AsyncClient":
+        if self._http is None:
+            # httpx импортируется долго, поэтому загружается при первом запросе
+            import httpx
+
+            self._http = httpx.AsyncClient(
+                base_url=f"{settings.JIRA_URL}/rest/api/2/",
+                headers={"Accept": "application/json"},
+                limits=httpx.Limits(
+                    max_connections=self.pool_maxsize,
+                    max_keepalive_connections=self.pool_maxsize,
+                ),
+                timeout=settings.JIRA_TIMEOUT,
+            )
+        return self._http
+
+    @staticmethod
+    def retry_after(response: "httpx.Response") -> Optional[float]:
+        """Delay requested by the Retry-After header, in seconds."""
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def _backoff(self, attempt: int) -> float:
+        # Экспоненциальная задержка с полным джиттером
+        return random.uniform(0, min(self.max_delay, self.backoff * 2 ** attempt))
+
+    async def _send(self, method: str, path: str, limiter: TokenBucket, **kwargs) -> "httpx.Response":
+        import httpx
+
+        waited = await self.limiter.acquire()
+        if limiter is not None:
+            waited += await limiter.acquire()
+        JIRA_RATE_LIMIT_WAIT.observe(waited)
+
+        self.breaker.before_request()
+        endpoint = jira_endpoint(path)
+        status = "error"
+        try:
+            with JIRA_REQUEST_DURATION.time(method=method, endpoint=endpoint):
+                response = await self.http.request(method, path, **kwargs)
+            status = response.status_code
+        except httpx.TransportError:
+            self.breaker.failure()
+            raise
+        except asyncio.CancelledError:
+            self.breaker.cancelled()
+            raise
+        finally:
+            JIRA_REQUESTS.inc(method=method, endpoint=endpoint, status=status)
+
+        if response.status_code >= 500:
+            self.breaker.failure()
+        else:
+            self.breaker.success()
+        return response
+
+    async def request(self, method: str, path: str, limiter: TokenBucket = None, **kwargs) -> "httpx.Response":
+        """
+        Send a request, retrying rate-limited and failed ones.
+
+        429 responses are retried for any method, since Jira has not processed
+        the request; server and network errors only for GET requests.
+
+        Args:
+            limiter (TokenBucket): Per-token limiter applied on top of the global one
+        """
+        import httpx
+
+        for attempt in range(self.max_retries + 1):
+            last = attempt == self.max_retries
+            try:
+                response = await self._send(method, path, limiter, **kwargs)
+            except httpx.TransportError as e:
+                if last or method != "GET":
+                    raise
+                delay = self._backoff(attempt)
+                reason = "network"
+                logger.warning(f"Jira request {method} {path} failed: {e!r}, retrying in {delay:.1f} s")
+            else:
+                if response.status_code not in RETRY_STATUSES or last:
+                    return response
+                if response.status_code != 429 and method != "GET":
+                    return response
+                delay = self.retry_after(response)
+                if delay is None:
+                    delay = self._backoff(attempt)
+                elif delay > self.max_delay:
+                    return response
+                reason = str(response.status_code)
+                logger.warning(f"Jira returned {response.status_code} for {method} {path}, retrying in {delay:.1f} s")
+                if response.status_code == 429 and limiter is not None:
+                    # Задерживаем все запросы этого токена, повтор дождется лимитера
+                    limiter.pause(delay)
+                    delay = 0
+            JIRA_RETRIES.inc(reason=reason)
+            if delay:
+                await asyncio.sleep(delay)
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
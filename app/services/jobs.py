@@ -0,0 +1,175 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue has no free slots."""
+
+
+class Job:
+    """Background job owned by a single user."""
+
+    def __init__(
+        self,
+        user_id: int,
+        run: Callable[[], Awaitable],
+        on_position: Optional[Callable[[int], Awaitable]] = None,
+        on_cancel: Optional[Callable[[], Awaitable]] = None,
+    ):
+        """
+        Args:
+            user_id (int): Telegram id of the job owner, used for dedup and cancellation
+            run (Callable): Coroutine factory doing the actual work and delivering the result
+            on_position (Callable): Called with the 1-based queue position whenever it changes
+            on_cancel (Callable): Called when the job is cancelled
+        """
+        self.user_id = user_id
+        self.run = run
+        self.on_position = on_position
+        self.on_cancel = on_cancel
+        self.task = None
+        self.cancelled = False
+
+
+class JobQueue:
+    """
+    FIFO queue of background jobs with a concurrency limit.
+
+    Each user can have at most one queued or running job. A running job may
+    take further execution slots for parts of its work with `slot()`, so the
+    total number of concurrent executions never exceeds `concurrency`.
+    Workers are started lazily on the first submit so the queue can be
+    created at import time.
+    """
+
+    def __init__(self, concurrency: int, max_size: int):
+        """
+        Args:
+            concurrency (int): Number of jobs executed at the same time
+            max_size (int): Maximum number of queued (not yet running) jobs
+        """
+        self.concurrency = concurrency
+        self.max_size = max_size
+        self._pending = deque()
+        self._jobs = {}  # user_id -> Job
+        self._workers = []
+        self._ready = None
+        self._slots = None
+
+    @property
+    def pending(self) -> int:
+        """Number of jobs waiting for a worker."""
+        return len(self._pending)
+
+    @property
+    def running(self) -> int:
+        """Number of jobs being executed."""
+        return len(self._jobs) - len(self._pending)
+
+    def has_job(self, user_id: int) -> bool:
+        return user_id in self._jobs
+
+    def submit(self, job: Job) -> Optional[int]:
+        """
+        Add a job to the queue.
+
+        Returns:
+            Optional[int]: Queue position of the job (0 if a worker is free),
+                or None if the user already has a job
+        """
+        if job.user_id in self._jobs:
+            return None
+        if len(self._pending) >= self.max_size:
+            raise QueueFullError()
+        self._start()
+        self._jobs[job.user_id] = job
+        self._pending.append(job)
+        self._ready.release()
+        free_workers = self.concurrency - self.running
+        return max(0, len(self._pending) - free_workers)
+
+    async def cancel(self, user_id: int) -> bool:
+        """Cancel the queued or running job of the user."""
+        job = self._jobs.get(user_id)
+        if job is None:
+            return False
+        job.cancelled = True
+        if job.task is not None:
+            job.task.cancel()
+            return True
+        self._pending.remove(job)
+        del self._jobs[user_id]
+        await self._notify(job.on_cancel)
+        self._notify_positions()
+        return True
+
+    def slot(self) -> asyncio.Semaphore:
+        """
+        Execution slot for a part of a running job's work, used as `async with queue.slot():`.
+
+        Waits while all slots are busy with jobs or other parts.
+        """
+        self._start()
+        return self._slots
+
+    def _start(self):
+        if self._workers:
+            return
+        self._ready = asyncio.Semaphore(0)
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    @staticmethod
+    async def _notify(callback, *args):
+        if callback is None:
+            return
+        try:
+            await callback(*args)
+        except Exception as e:
+            logger.debug(f"Error in job callback: {e}")
+
+    def _notify_positions(self):
+        for position, job in enumerate(self._pending, start=1):
+            if job.on_position is not None:
+                asyncio.create_task(self._notify(job.on_position, position))
+
+    async def _worker(self):
+        while True:
+            await self._ready.acquire()
+            async with self._slots:
+                await self._run_next()
+
+    async def _run_next(self):
+        if not self._pending:
+            # Задание было отменено, пока ожидало в очереди
+            return
+        job = self._pending.popleft()
+        self._notify_positions()
+        job.task = asyncio.create_task(job.run())
+        try:
+            await job.task
+        except asyncio.CancelledError:
+            if not job.cancelled:
+                raise
+            logger.info(f"Job of user {job.user_id} was cancelled")
+            await self._notify(job.on_cancel)
+        except Exception as e:
+            logger.error(f"Error in job of user {job.user_id}: {e}")
+        finally:
+            self._jobs.pop(job.user_id, None)
+
+    async def close(self):
+        """Stop the workers and cancel running jobs."""
+        for job in list(self._jobs.values()):
+            if job.task is not None:
+                job.task.cancel()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._pending.clear()
+        self._jobs.clear()
@@ -0,0 +1,76 @@
+import hashlib
+import logging
+from datetime import datetime, timedelta
+
+from app.core.config import settings
+from app.core.database import LLMCacheEntry, session_scope
+
+logger = logging.getLogger(__name__)
+
+
+class LLMCache:
+    """
+    Persistent cache of LLM responses stored in the application database.
+
+    get and put are blocking; coroutines call them through asyncio.to_thread.
+    """
+
+    def __init__(self, ttl: int, max_entries: int):
+        """
+        Args:
+            ttl (int): Lifetime of an entry in seconds
+            max_entries (int): Maximum number of stored entries
+        """
+        self.ttl = timedelta(seconds=ttl)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(promt: str, model: str, message: str) -> str:
+        """Build a cache key from the prompt file contents, model name and user content."""
+        digest = hashlib.sha256()
+        for part in (promt, model, message):
+            digest.update(part.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key: str):
+        """Return the cached response or None."""
+        now = datetime.utcnow()
+        with session_scope() as db:
+            entry = db.get(LLMCacheEntry, key)
+            if entry is None or now - entry.created_at > self.ttl:
+                self.misses += 1
+                logger.debug(f"LLM cache miss {key}")
+                return None
+            entry.last_used_at = now
+            self.hits += 1
+            logger.debug(f"LLM cache hit {key}")
+            return entry.response
+
+    def put(self, key: str, model: str, response: str):
+        """Store a response and evict expired and least recently used entries."""
+        now = datetime.utcnow()
+        with session_scope() as db:
+            db.merge(LLMCacheEntry(
+                key=key, model=model, response=response, created_at=now, last_used_at=now
+            ))
+            db.query(LLMCacheEntry).filter(LLMCacheEntry.created_at < now - self.ttl).delete()
+            stale = (
+                db.query(LLMCacheEntry.key)
+                .order_by(LLMCacheEntry.last_used_at.desc())
+                .offset(self.max_entries)
+                .all()
+            )
+            if stale:
+                db.query(LLMCacheEntry).filter(
+                    LLMCacheEntry.key.in_([row.key for row in stale])
+                ).delete(synchronize_session=False)
+
+    def stats(self) -> dict:
+        """Hit/miss counters since process start."""
+        return {"hits": self.hits, "misses": self.misses}
+
+
+llm_cache = LLMCache(ttl=settings.LLM_CACHE_TTL, max_entries=settings.LLM_CACHE_MAX_ENTRIES)
@@ -0,0 +1,101 @@
+import logging
+from typing import Optional
+
+from aiohttp import web
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.jira_transport import JIRA_REQUEST_DURATION, JIRA_REQUESTS
+from app.services.llm_cache import llm_cache
+from app.services.neuro import (
+    LLM_GENERATION_DURATION,
+    LLM_TIME_TO_FIRST_TOKEN,
+    OLLAMA_EVAL_TOKENS,
+    OLLAMA_PROMPT_TOKENS,
+    OLLAMA_TOKENS_PER_SECOND,
+    llm_queue,
+)
+
+logger = logging.getLogger(__name__)
+
+HANDLER_DURATION = metrics.histogram(
+    "bot_handler_duration_seconds", "Duration of Telegram update handlers.", ("handler",)
+)
+LLM_QUEUE_WAIT = metrics.histogram(
+    "llm_queue_wait_seconds", "Time LLM jobs spend in the queue before running.",
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600),
+)
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Prometheus-Format": "0.0.4"})
+
+
+async def run_metrics_server() -> Optional[web.AppRunner]:
+    """
+    Start the Prometheus endpoint, returns the runner to clean up on shutdown.
+
+    Metrics are optional: if the port cannot be bound, the error is logged and
+    None is returned instead of stopping the bot.
+    """
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, settings.METRICS_HOST, settings.METRICS_PORT)
+    try:
+        await site.start()
+    except OSError as e:
+        logger.error(
+            f"Cannot serve metrics on {settings.METRICS_HOST}:{settings.METRICS_PORT}, "
+            f"metrics endpoint is disabled: {e}"
+        )
+        await runner.cleanup()
+        return None
+    logger.info(f"Metrics are served on {settings.METRICS_HOST}:{settings.METRICS_PORT}/metrics")
+    return runner
+
+
+def _timing(summary: dict) -> str:
+    return f"{summary['count']} шт., среднее {summary['mean']:.2f} с, p95 {summary['p95']:.2f} с"
+
+
+def format_stats() -> str:
+    """Краткая сводка метрик для команды /stats."""
+    lines = ["📊 Статистика", "", "Команды:"]
+    for labels in HANDLER_DURATION.label_sets():
+        lines.append(f"  {labels['handler']}: {_timing(HANDLER_DURATION.summary(**labels))}")
+
+    lines += ["", "Jira:"]
+    errors = {}
+    for labels in JIRA_REQUESTS.label_sets():
+        if not str(labels["status"]).startswith(("2", "3")):
+            key = (labels["method"], labels["endpoint"])
+            errors[key] = errors.get(key, 0) + JIRA_REQUESTS.value(**labels)
+    for labels in JIRA_REQUEST_DURATION.label_sets():
+        line = f"  {labels['method']} {labels['endpoint']}: {_timing(JIRA_REQUEST_DURATION.summary(**labels))}"
+        failed = errors.get((labels["method"], labels["endpoint"]))
+        if failed:
+            line += f", ошибок {failed}"
+        lines.append(line)
+
+    lines += ["", "Нейросеть:"]
+    for labels in LLM_GENERATION_DURATION.label_sets():
+        lines.append(f"  генерации ({labels['mode']}): {_timing(LLM_GENERATION_DURATION.summary(**labels))}")
+    first_token = LLM_TIME_TO_FIRST_TOKEN.summary()
+    if first_token["count"]:
+        lines.append(f"  первый токен: p50 {first_token['p50']:.2f} с, p95 {first_token['p95']:.2f} с")
+    for labels in OLLAMA_EVAL_TOKENS.label_sets():
+        speed = OLLAMA_TOKENS_PER_SECOND.summary(**labels)
+        lines.append(
+            f"  {labels['model']}: токенов промпта {OLLAMA_PROMPT_TOKENS.value(**labels):.0f}, "
+            f"ответа {OLLAMA_EVAL_TOKENS.value(**labels):.0f}, скорость p50 {speed['p50']:.1f} ток/с"
+        )
+    wait = LLM_QUEUE_WAIT.summary()
+    lines.append(
+        f"  очередь: ожидают {llm_queue.pending}, выполняются {llm_queue.running}, "
+        f"ожидание p95 {wait['p95']:.1f} с"
+    )
+    lines.append(f"  кэш: попаданий {llm_cache.hits}, промахов {llm_cache.misses}")
+    return "\n".join(lines)
@@ -1,14 +1,76 @@
-import ollama
+import asyncio
+import logging
+from collections import deque
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.jobs import JobQueue
+from app.services.llm_cache import llm_cache
+from app.services.ollama_router import OllamaHost, model_name, ollama_router
+from app.utils.helpers import merge_summaries, renumber_summary
 import os
 import re
+import time
 
-# Инициализация клиента Ollama
-ollama_client = ollama.Client(host=settings.OLLAMA_HOST)
+logger = logging.getLogger(__name__)
 
+# Очередь запросов к нейросети
+llm_queue = JobQueue(concurrency=settings.LLM_CONCURRENCY, max_size=settings.LLM_QUEUE_MAX_SIZE)
 
-def get_issue(client, model, message):
-    response = client.chat(
+# Метрики генераций
+LLM_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+LLM_GENERATION_DURATION = metrics.histogram(
+    "llm_generation_duration_seconds", "Duration of LLM generations (cache misses).", ("mode",), LLM_BUCKETS
+)
+LLM_TIME_TO_FIRST_TOKEN = metrics.histogram(
+    "llm_time_to_first_token_seconds", "Time until the first streamed token.", buckets=LLM_BUCKETS
+)
+OLLAMA_PROMPT_TOKENS = metrics.counter("ollama_prompt_tokens_total", "Prompt tokens evaluated by Ollama.", ("model",))
+OLLAMA_EVAL_TOKENS = metrics.counter("ollama_eval_tokens_total", "Tokens generated by Ollama.", ("model",))
+OLLAMA_TOKENS_PER_SECOND = metrics.histogram(
+    "ollama_eval_tokens_per_second", "Generation speed reported by Ollama.", ("model",),
+    (1, 2, 5, 10, 15, 20, 30, 50, 75, 100, 200),
+)
+LLM_CJK_RETRIES = metrics.counter(
+    "llm_cjk_retries_total", "Generations aborted because the model switched to Chinese.", ("mode",)
+)
+metrics.gauge("llm_queue_pending", "LLM jobs waiting in the queue.", callback=lambda: llm_queue.pending)
+metrics.gauge("llm_queue_running", "LLM jobs being executed.", callback=lambda: llm_queue.running)
+metrics.counter("llm_cache_hits_total", "LLM response cache hits.", callback=lambda: llm_cache.hits)
+metrics.counter("llm_cache_misses_total", "LLM response cache misses.", callback=lambda: llm_cache.misses)
+
+
+def record_usage(response):
+    """Записывает статистику токенов из финального ответа Ollama."""
+    model = response.get("model") or ""
+    OLLAMA_PROMPT_TOKENS.inc(response.get("prompt_eval_count") or 0, model=model)
+    eval_count = response.get("eval_count") or 0
+    OLLAMA_EVAL_TOKENS.inc(eval_count, model=model)
+    eval_duration = response.get("eval_duration") or 0
+    if eval_count and eval_duration:
+        OLLAMA_TOKENS_PER_SECOND.observe(eval_count / (eval_duration / 1e9), model=model)
+
+
+def has_cjk(text: str) -> bool:
+    """Проверяет, есть ли в тексте китайские иероглифы."""
+    return bool(re.search(r"[\u4e00-\u9fff]", text))
+
+
+class CJKOutputError(Exception):
+    """Модель начала отвечать иероглифами, генерация прервана."""
+
+
+# Отдается в потоке вместо текста, когда начатый ответ отброшен и генерация началась заново
+RESTART = object()
+
+
+async def stream_issue(client, model, message, abort_on_cjk: bool = False):
+    """
+    Потоково получает ответ модели, отдавая текст по частям.
+
+    С abort_on_cjk при первой части с иероглифами соединение закрывается,
+    Ollama прекращает генерацию, и выбрасывается CJKOutputError.
+    """
+    stream = await client.chat(
         model=model,
         messages=[
             {
@@ -16,37 +78,303 @@ def get_issue(client, model, message):
                 "content": message,
             },
         ],
+        stream=True,
+        keep_alive=settings.OLLAMA_KEEP_ALIVE,
     )
-    if re.findall(r"[\u4e00-\u9fff]+", response["message"]["content"]):
-        response = client.chat(
-            model=model,
-            messages=[
-                {
-                    "role": "user",
-                    "content": message,
-                },
-            ],
-        )
-    return response["message"]["content"]
+    try:
+        async for part in stream:
+            if part.get("done"):
+                record_usage(part)
+            content = part["message"]["content"]
+            if abort_on_cjk and has_cjk(content):
+                raise CJKOutputError()
+            if content:
+                yield content
+    finally:
+        await stream.aclose()
+
+
+class PromptModel:
+    """
+    Модель Ollama, собранная из Modelfile с промптом в качестве SYSTEM.
+
+    Промпт читается с диска один раз и перечитывается только при изменении
+    mtime файла; при изменении промпта модель пересобирается.
+    """
+
+    def __init__(self, modelfile_path: str, promt_path: str):
+        self.modelfile_path = modelfile_path
+        self.promt_path = promt_path
+        self._promt = None
+        self._promt_mtime = None
+        self._built = {}  # (хост, имя модели) -> промпт, с которым она собрана
+        self._lock = asyncio.Lock()
+
+    @property
+    def promt(self) -> str:
+        """Текущий промпт, перечитывается при изменении файла."""
+        mtime = os.stat(self.promt_path).st_mtime
+        if mtime != self._promt_mtime:
+            with open(self.promt_path, "r") as file:
+                self._promt = file.read()
+            self._promt_mtime = mtime
+        return self._promt
+
+    def modelfile(self, promt: str) -> str:
+        with open(self.modelfile_path, "r") as file:
+            base = file.read()
+        return f'{base.rstrip()}\nSYSTEM """{promt}"""\n'
+
+    async def ensure(self, host: OllamaHost, model: str) -> str:
+        """Собирает модель на хосте, если она еще не собрана с текущим промптом. Возвращает промпт."""
+        promt = self.promt
+        if self._built.get((host.url, model)) == promt:
+            return promt
+        async with self._lock:
+            if self._built.get((host.url, model)) != promt:
+                logger.info(f"Creating Ollama model {model} on {host.url} from Modelfile")
+                await host.client.create(model=model, modelfile=self.modelfile(promt))
+                self._built[(host.url, model)] = promt
+        return promt
+
+    async def warm_up(self, host: OllamaHost, model: str):
+        """Собирает модель и загружает ее в память, чтобы первый запрос не ждал загрузки."""
+        await self.ensure(host, model)
+        await host.client.generate(model=model, keep_alive=settings.OLLAMA_KEEP_ALIVE)
+        host.loaded.add(model_name(model))
+        logger.info(f"Ollama model {model} is loaded on {host.url}")
+
+
+prompt_model = PromptModel(
+    modelfile_path=os.path.join(settings.FILES_DIR, "Modelfile"),
+    promt_path=os.path.join(settings.FILES_DIR, "promt"),
+)
+
+
+async def _warm_up_host(host: OllamaHost, model: str):
+    try:
+        await prompt_model.warm_up(host, model)
+    except Exception as e:
+        logger.warning(f"Error warming up Ollama model {model} on {host.url}: {e}")
+
+
+async def warm_up(model: str = settings.OLLAMA_MODEL):
+    """Подготавливает модель на всех хостах при старте бота."""
+    await asyncio.gather(*(_warm_up_host(host, model) for host in ollama_router.hosts))
+
+
+async def cached_response(message: str, model: str = settings.OLLAMA_MODEL):
+    """Возвращает закэшированный ответ модели или None."""
+    try:
+        return await asyncio.to_thread(llm_cache.get, llm_cache.make_key(prompt_model.promt, model, message))
+    except Exception as e:
+        logger.warning(f"Error reading LLM cache: {e}")
+        return None
+
+
+async def cached_summary(prompts: list, model: str = settings.OLLAMA_MODEL):
+    """Возвращает закэшированный ответ на все части отчета или None."""
+    summaries = []
+    for prompt in prompts:
+        summary = await cached_response(prompt, model)
+        if summary is None:
+            return None
+        summaries.append(summary)
+    return merge_summaries(summaries)
+
+
+async def _stream_from(host: OllamaHost, model: str, message: str, abort_on_cjk: bool):
+    await prompt_model.ensure(host, model)
+    async for chunk in stream_issue(host.client, model, message, abort_on_cjk):
+        yield chunk
 
 
-def send_message(message: str, model: str = "qwen2.5:14b") -> str:
+async def _generate(message: str, model: str) -> str:
+    """
+    Получает ответ модели целиком через роутер хостов.
+
+    Генерация идет потоком: роутер замеряет время до первой части ответа,
+    а при иероглифах генерация прерывается сразу и повторяется один раз.
+    """
+    def chunks(abort_on_cjk: bool):
+        return ollama_router.stream(model, lambda host: _stream_from(host, model, message, abort_on_cjk))
+
+    try:
+        return "".join([chunk async for chunk in chunks(abort_on_cjk=True)])
+    except CJKOutputError:
+        LLM_CJK_RETRIES.inc(mode="blocking")
+        return "".join([chunk async for chunk in chunks(abort_on_cjk=False)])
+
+
+async def _stream_message(message: str, model: str, refresh: bool):
+    try:
+        key = llm_cache.make_key(prompt_model.promt, model, message)
+        cached = None if refresh else await asyncio.to_thread(llm_cache.get, key)
+        if cached is not None:
+            yield cached
+            return
+
+        parts = []
+        started = time.perf_counter()
+        # Первая попытка прерывается на первых иероглифах, вторая доводится до конца
+        for abort_on_cjk in (True, False):
+            chunks = ollama_router.stream(
+                model, lambda host: _stream_from(host, model, message, abort_on_cjk)
+            )
+            try:
+                async for chunk in chunks:
+                    if not parts:
+                        LLM_TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - started)
+                    parts.append(chunk)
+                    yield chunk
+                break
+            except CJKOutputError:
+                LLM_CJK_RETRIES.inc(mode="stream")
+                if parts:
+                    parts = []
+                    yield RESTART
+        LLM_GENERATION_DURATION.observe(time.perf_counter() - started, mode="stream")
+        response = "".join(parts)
+        if response and not has_cjk(response):
+            await asyncio.to_thread(llm_cache.put, key, model, response)
+    except Exception as e:
+        yield f"Ошибка при отправке сообщения: {str(e)}"
+
+
+async def send_message(
+    message: str, model: str = settings.OLLAMA_MODEL, stream: bool = False, refresh: bool = False
+):
     """
     Отправляет сообщение в модель Ollama и возвращает ответ.
 
+    Промпт передается модели как SYSTEM из собранной модели, поэтому
+    в запрос уходит только само сообщение. Ответы кэшируются в базе данных
+    по хэшу промпта, модели и сообщения.
+
     Args:
         message (str): Текст сообщения для отправки
-        model (str): Название модели (по умолчанию "qwen")
+        model (str): Название модели, собираемой из Modelfile
+        stream (bool): Вернуть асинхронный итератор частей ответа вместо строки
+        refresh (bool): Игнорировать кэш и сгенерировать ответ заново
+
+    Returns:
+        str | AsyncIterator[str]: Ответ от модели
+    """
+    if stream:
+        return _stream_message(message, model, refresh)
+    try:
+        return await _complete(message, model, refresh)
+    except Exception as e:
+        return f"Ошибка при отправке сообщения: {str(e)}"
+
+
+async def _complete(message: str, model: str, refresh: bool) -> str:
+    key = llm_cache.make_key(prompt_model.promt, model, message)
+    cached = None if refresh else await asyncio.to_thread(llm_cache.get, key)
+    if cached is not None:
+        return cached
+    with LLM_GENERATION_DURATION.time(mode="blocking"):
+        response = await _generate(message, model)
+    if not has_cjk(response):
+        await asyncio.to_thread(llm_cache.put, key, model, response)
+    return response
+
+
+async def summarize(
+    prompts: list, model: str = settings.OLLAMA_MODEL, stream: bool = False, refresh: bool = False
+):
+    """
+    Краткий отчет по промптам из worklog_to_prompts.
+
+    Вызывается из задания llm_queue. Каждая часть отчета обрабатывается
+    отдельно: по порядку в месте самого задания и, пока в очереди есть
+    свободные места, параллельно в них, так что генераций одновременно не
+    больше LLM_CONCURRENCY. Ответы объединяются в один нумерованный список;
+    в потоковом режиме первая часть выводится по мере генерации.
+
+    Args:
+        prompts (list): Части отчета
+        model (str): Название модели, собираемой из Modelfile
+        stream (bool): Вернуть асинхронный итератор частей ответа вместо строки
+        refresh (bool): Игнорировать кэш и сгенерировать ответ заново
 
     Returns:
-        str: Ответ от модели
+        str | AsyncIterator[str]: Ответ от модели
     """
+    if len(prompts) == 1:
+        return await send_message(prompts[0], model, stream, refresh)
+    if stream:
+        return _stream_summary(prompts, model, refresh)
+    parts = _SummaryParts(prompts, model, refresh)
     try:
-        # Загружаем модель из Modelfile
-        modelfile_path = os.path.join(settings.FILES_DIR, "Modelfile")
-        promt_path = os.path.join(settings.FILES_DIR, "promt")
-        with open(promt_path, "r") as file:
-            promt = file.read()
-        return get_issue(ollama_client, model, str(promt + message))
+        await parts.take()
+        return merge_summaries([await result for result in parts.results])
     except Exception as e:
         return f"Ошибка при отправке сообщения: {str(e)}"
+    finally:
+        await parts.close()
+
+
+class _SummaryParts:
+    """
+    Answers to the parts of a report, generated in the LLM queue slots.
+
+    The job's own slot works through the parts with `take()`; helpers wait
+    for free slots of llm_queue and take parts in parallel while any are left.
+    """
+
+    def __init__(self, prompts: list, model: str, refresh: bool):
+        self.model = model
+        self.refresh = refresh
+        self._pending = deque(enumerate(prompts))
+        loop = asyncio.get_running_loop()
+        self.results = [loop.create_future() for _ in prompts]
+        helpers = min(len(prompts), llm_queue.concurrency) - 1
+        self._helpers = [asyncio.create_task(self._borrowed()) for _ in range(helpers)]
+
+    async def take(self):
+        """Generate the parts left, one by one."""
+        while self._pending:
+            index, prompt = self._pending.popleft()
+            try:
+                self.results[index].set_result(await _complete(prompt, self.model, self.refresh))
+            except Exception as e:
+                self.results[index].set_exception(e)
+
+    async def _borrowed(self):
+        async with llm_queue.slot():
+            await self.take()
+
+    async def close(self):
+        for helper in self._helpers:
+            helper.cancel()
+        await asyncio.gather(*self._helpers, return_exceptions=True)
+        for result in self.results:
+            # Ошибки частей после первой неудачной уже не нужны
+            if result.done() and not result.cancelled():
+                result.exception()
+
+
+async def _stream_summary(prompts: list, model: str, refresh: bool):
+    # Первая часть выводится потоком, остальные генерируются в свободных местах очереди
+    parts = _SummaryParts(prompts[1:], model, refresh)
+    try:
+        first = ""
+        async for chunk in _stream_message(prompts[0], model, refresh):
+            first = "" if chunk is RESTART else first + chunk
+            yield chunk
+        await parts.take()
+
+        _, offset = renumber_summary(first, 0)
+        separator = "\n" if first.endswith("\n") else "\n\n"
+        for result in parts.results:
+            try:
+                summary = await result
+            except Exception as e:
+                yield f"{separator}Ошибка при отправке сообщения: {str(e)}"
+                return
+            text, offset = renumber_summary(summary, offset)
+            yield f"{separator}{text}"
+            separator = "\n\n"
+    finally:
+        await parts.close()
@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Callable, Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+OLLAMA_REQUESTS = metrics.counter("ollama_requests_total", "Requests routed to Ollama hosts.", ("host", "result"))
+OLLAMA_HOST_UP = metrics.gauge("ollama_host_up", "1 if the Ollama host is considered available.", ("host",))
+OLLAMA_HOST_LATENCY = metrics.gauge(
+    "ollama_host_latency_seconds", "Moving average of time to the first chunk per Ollama host.", ("host",)
+)
+OLLAMA_HOST_OUTSTANDING = metrics.gauge(
+    "ollama_host_outstanding_requests", "Requests in progress per Ollama host.", ("host",)
+)
+
+# Во сколько раз дороже хост, на котором модель еще не загружена в память
+UNLOADED_PENALTY = 3.0
+
+
+def model_name(name: str) -> str:
+    """Model name with the tag, as reported by /api/ps."""
+    return name if ":" in name else f"{name}:latest"
+
+
+def is_failover_error(error: Exception) -> bool:
+    """Errors after which the request can be repeated on another host."""
+    import httpx
+    from ollama import ResponseError
+
+    if isinstance(error, (httpx.TransportError, ConnectionError)):
+        return True
+    return isinstance(error, ResponseError) and error.status_code >= 500
+
+
+class OllamaHost:
+    """One Ollama backend with its routing statistics."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.latency = None  # EWMA of time to the first chunk, seconds
+        self.loaded = set()  # models loaded in memory according to /api/ps
+        self.down_until = 0.0
+        self._client = None
+
+    @property
+    def client(self):
+        """ollama.AsyncClient of the host; the package is imported on first use."""
+        if self._client is None:
+            import ollama
+
+            self._client = ollama.AsyncClient(host=self.url)
+        return self._client
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+
+class OllamaRouter:
+    """
+    Routes LLM requests between several Ollama hosts.
+
+    A request goes to the host with the lowest expected cost: requests in
+    progress times the moving average of the time to the first chunk, with a
+    penalty for hosts that do not have the model loaded. The whole generation
+    time depends on the answer length rather than on the host, so it is not
+    measured. On connection and server errors the host is taken out of
+    rotation for `retry_after` seconds and the request is repeated on the
+    next host, until the first chunk has been yielded.
+    """
+
+    def __init__(self, urls: list, probe_interval: float, retry_after: float, alpha: float):
+        """
+        Args:
+            urls (list): Base URLs of the Ollama hosts
+            probe_interval (float): Seconds between health probes via /api/ps
+            retry_after (float): Seconds a failed host is skipped unless a probe succeeds earlier
+            alpha (float): Weight of the latest request in the latency moving average
+        """
+        if not urls:
+            raise ValueError("At least one Ollama host is required, check OLLAMA_HOST")
+        self.hosts = [OllamaHost(url) for url in urls]
+        self.probe_interval = probe_interval
+        self.retry_after = retry_after
+        self.alpha = alpha
+        for host in self.hosts:
+            OLLAMA_HOST_UP.set(1, host=host.url)
+
+    def _cost(self, host: OllamaHost, model: str) -> float:
+        known = [h.latency for h in self.hosts if h.latency is not None]
+        # Хост без замеров считаем средним, чтобы он тоже получал запросы
+        latency = host.latency if host.latency is not None else (sum(known) / len(known) if known else 1.0)
+        cost = (host.outstanding + 1) * latency
+        if model_name(model) not in host.loaded:
+            cost *= UNLOADED_PENALTY
+        return cost
+
+    def pick(self, model: str, exclude: list = ()) -> Optional[OllamaHost]:
+        """Choose a host for the request, or None if every host has been tried."""
+        candidates = [host for host in self.hosts if host not in exclude]
+        available = [host for host in candidates if host.available]
+        # Если недоступны все хосты, все равно пробуем: один из них мог подняться
+        candidates = available or candidates
+        if not candidates:
+            return None
+        return min(candidates, key=lambda host: self._cost(host, model))
+
+    def _mark_down(self, host: OllamaHost, error: Exception):
+        logger.warning(f"Ollama host {host.url} failed, skipping it for {self.retry_after:.0f} s: {error!r}")
+        host.down_until = time.monotonic() + self.retry_after
+        OLLAMA_HOST_UP.set(0, host=host.url)
+
+    def _observe(self, host: OllamaHost, model: str, first_chunk: float):
+        if host.latency is None:
+            host.latency = first_chunk
+        else:
+            host.latency += self.alpha * (first_chunk - host.latency)
+        host.loaded.add(model_name(model))
+        OLLAMA_HOST_LATENCY.set(host.latency, host=host.url)
+
+    def _acquire(self, host: OllamaHost):
+        host.outstanding += 1
+        OLLAMA_HOST_OUTSTANDING.set(host.outstanding, host=host.url)
+
+    def _release(self, host: OllamaHost):
+        host.outstanding -= 1
+        OLLAMA_HOST_OUTSTANDING.set(host.outstanding, host=host.url)
+
+    async def stream(self, model: str, open_stream: Callable[[OllamaHost], AsyncIterator]) -> AsyncIterator:
+        """Yield items of `open_stream(host)` from the best host, failing over before the first item."""
+        tried = []
+        while True:
+            host = self.pick(model, tried)
+            if host is None:
+                raise error
+            tried.append(host)
+            self._acquire(host)
+            started = time.monotonic()
+            streamed = False
+            try:
+                async for item in open_stream(host):
+                    if not streamed:
+                        streamed = True
+                        self._observe(host, model, time.monotonic() - started)
+                    yield item
+            except Exception as e:
+                if streamed or not is_failover_error(e):
+                    OLLAMA_REQUESTS.inc(host=host.url, result="error")
+                    raise
+                OLLAMA_REQUESTS.inc(host=host.url, result="failover")
+                self._mark_down(host, e)
+                error = e
+                continue
+            finally:
+                self._release(host)
+            OLLAMA_REQUESTS.inc(host=host.url, result="ok")
+            return
+
+    async def probe(self, host: OllamaHost):
+        """Check the host and refresh the list of models loaded in memory."""
+        try:
+            response = await asyncio.wait_for(host.client.ps(), timeout=self.probe_interval)
+        except Exception as e:
+            if host.available:
+                self._mark_down(host, e)
+            else:
+                host.down_until = time.monotonic() + self.retry_after
+            return
+        if not host.available:
+            logger.info(f"Ollama host {host.url} is back")
+        host.down_until = 0.0
+        host.loaded = {model_name(m.model or m.name) for m in response.models if m.model or m.name}
+        OLLAMA_HOST_UP.set(1, host=host.url)
+
+    async def run_probes(self):
+        """Probe all hosts periodically until cancelled."""
+        while True:
+            await asyncio.gather(*(self.probe(host) for host in self.hosts))
+            await asyncio.sleep(self.probe_interval)
+
+
+ollama_router = OllamaRouter(
+    urls=settings.OLLAMA_HOSTS,
+    probe_interval=settings.OLLAMA_PROBE_INTERVAL,
+    retry_after=settings.OLLAMA_RETRY_AFTER,
+    alpha=settings.OLLAMA_LATENCY_ALPHA,
+)
@@ -1,142 +1,422 @@
+import asyncio
+import functools
 import logging
-import telebot
-from telebot.handler_backends import State, StatesGroup
-from telebot.storage import StateMemoryStorage
+import time
+from telebot import asyncio_filters
+from telebot.asyncio_helper import ApiTelegramException
+from telebot.async_telebot import AsyncTeleBot
+from telebot.asyncio_handler_backends import BaseMiddleware, State, StatesGroup
 
 from app.core.config import settings
-from app.core.database import SessionLocal, User
-from app.services.jira import JiraService
-from app.services.neuro import send_message
-from app.utils.helpers import format_issue_message, format_worklog_message, worklog_to_prompt
+from app.core.state_storage import PersistentStateStorage, create_state_storage
+from app.services.digest import digest_scheduler
+from app.services.jira import NO_TRANSITION, NOT_FOUND, JiraError, JiraService, jira_clients
+from app.services.jobs import Job, QueueFullError
+from app.services.monitoring import HANDLER_DURATION, LLM_QUEUE_WAIT, format_stats, run_metrics_server
+from app.services.neuro import RESTART, cached_summary, llm_queue, summarize, warm_up
+from app.services.ollama_router import ollama_router
+from app.services.users import user_tokens
+from app.services.webhook import run_webhook
+from app.services.worklog_store import worklog_store
+from app.utils.helpers import (
+    TELEGRAM_MESSAGE_LIMIT,
+    escape_markdown,
+    format_issue_message,
+    format_team_worklog_messages,
+    format_worklog_messages,
+    parse_issue_keys,
+    split_issue_keys,
+    split_message,
+    team_worklog_to_prompts,
+    worklog_to_prompts,
+)
 
-from jira import JIRAError
-
-# Настройка логирования
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Инициализация бота и хранилища состояний
-state_storage = StateMemoryStorage()
-bot = telebot.TeleBot(settings.TELEGRAM_BOT_TOKEN, state_storage=state_storage)
+# Бот и хранилище состояний создаются в create_bot() при запуске, а не при импорте
+bot: AsyncTeleBot = None
+state_storage = None
+
+# Обработчики в порядке объявления: (обработчик, фильтры message_handler)
+_handlers = []
 
 class UserStates(StatesGroup):
     waiting_for_token = State()
     waiting_for_issue_key = State()
 
-def get_db():
-    logger.debug("Getting database session")
-    db = SessionLocal()
+class UserOrderingMiddleware(BaseMiddleware):
+    """Обрабатывает сообщения одного пользователя строго по очереди.
+
+    Обновления разных пользователей обрабатываются конкурентно, а сообщения
+    одного пользователя (например, /get_issue и следующий за ним ключ задачи)
+    не обгоняют друг друга.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.update_types = ['message']
+        self._locks = {}  # user_id -> [lock, число ожидающих обработчиков]
+
+    async def pre_process(self, message, data):
+        entry = self._locks.setdefault(message.from_user.id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        await entry[0].acquire()
+
+    async def post_process(self, message, data, exception):
+        entry = self._locks[message.from_user.id]
+        entry[0].release()
+        entry[1] -= 1
+        if not entry[1]:
+            del self._locks[message.from_user.id]
+
+
+def message_handler(**filters):
+    """Объявляет обработчик сообщений; в боте он регистрируется в create_bot()."""
+    def decorator(handler):
+        _handlers.append((handler, filters))
+        return handler
+    return decorator
+
+def create_bot() -> AsyncTeleBot:
+    """Создает бота и хранилище состояний и регистрирует обработчики."""
+    global bot, state_storage
+    state_storage = create_state_storage()
+    bot = AsyncTeleBot(settings.TELEGRAM_BOT_TOKEN, state_storage=state_storage)
+    bot.add_custom_filter(asyncio_filters.StateFilter(bot))
+    bot.setup_middleware(UserOrderingMiddleware())
+    for handler, filters in _handlers:
+        bot.register_message_handler(handler, **filters)
+    return bot
+
+def instrumented(handler):
+    """Замеряет длительность обработчика для метрик."""
+    @functools.wraps(handler)
+    async def wrapper(message):
+        with HANDLER_DURATION.time(handler=handler.__name__):
+            return await handler(message)
+    return wrapper
+
+NEURO_WAIT_TEXT = "Отправляю данные в нейросеть.\nЭто может занять некоторое время..."
+
+async def edit_message(placeholder, text: str):
+    """Редактирует сообщение, игнорируя ошибки Telegram (например, "message is not modified")."""
     try:
-        return db
-    finally:
-        db.close()
-        logger.debug("Database session closed")
+        await bot.edit_message_text(text, placeholder.chat.id, placeholder.message_id)
+    except ApiTelegramException as e:
+        logger.debug(f"Error editing message: {e}")
+
+async def send_markdown_messages(chat_id: int, parts: list, reply_to_message_id: int = None):
+    """
+    Отправляет ответ из нескольких сообщений MarkdownV2 по порядку.
+
+    Если Telegram не принял разметку, без форматирования пересылается только
+    это сообщение.
+    """
+    for part in parts:
+        try:
+            await bot.send_message(
+                chat_id, part, parse_mode="MarkdownV2", disable_web_page_preview=True,
+                reply_to_message_id=reply_to_message_id,
+            )
+        except ApiTelegramException as parse_error:
+            # Если возникла ошибка парсинга, отправляем без форматирования
+            logger.error(f"Error parsing markdown: {parse_error}")
+            await bot.send_message(
+                chat_id, part, disable_web_page_preview=True, reply_to_message_id=reply_to_message_id
+            )
 
-@bot.message_handler(commands=['start'])
-def start_command(message):
+async def stream_to_message(placeholder, chunks) -> str:
+    """
+    Выводит потоковый ответ нейросети, редактируя сообщение-заглушку.
+
+    Telegram ограничивает частоту редактирования, поэтому промежуточный текст
+    обновляется не чаще раза в TELEGRAM_EDIT_INTERVAL секунд.
+    """
+    text = ""
+    shown = ""
+    last_edit = 0.0
+    async for chunk in chunks:
+        # Нейросеть начала ответ заново: показанный текст заменится новым
+        text = "" if chunk is RESTART else text + chunk
+        now = time.monotonic()
+        preview = text[:TELEGRAM_MESSAGE_LIMIT].strip()
+        if preview and preview != shown and now - last_edit >= settings.TELEGRAM_EDIT_INTERVAL:
+            await edit_message(placeholder, preview)
+            shown = preview
+            last_edit = now
+
+    parts = split_message(text) or ["Пустой ответ нейросети"]
+    if parts[0].strip() != shown:
+        await edit_message(placeholder, parts[0])
+    for part in parts[1:]:
+        await bot.send_message(placeholder.chat.id, part)
+    return text
+
+@message_handler(commands=['start'])
+@instrumented
+async def start_command(message):
     logger.info(f"User {message.from_user.id} started the bot")
-    bot.reply_to(
+    await bot.reply_to(
         message,
         "Привет! Я бот для работы с Jira. "
         "Для начала работы установите ваш токен Jira с помощью команды /set_token\n\n"
         "Доступные команды:\n"
         "/set_token - Установить токен Jira\n"
         "/remove_token - Удалить токен\n"
-        "/get_issue - Получить информацию о задаче\n"
+        "/get_issue - Получить информацию о задачах\n"
+        "/move - Перевести задачи в статус (/move PROJ-1 PROJ-2 Done)\n"
         "/worklog - Получить отчет о работе за последние 3 дня\n"
+        "/worklog_neuro - Краткий отчет о работе с помощью нейросети\n"
+        "/worklog_neuro refresh - Сгенерировать краткий отчет заново\n"
+        "/team_worklog - Отчет команды (/team_worklog neuro - с кратким отчетом нейросети)\n"
+        "/cancel - Отменить запрос к нейросети\n"
+        "/digest_on - Присылать отчет перед сдачей (/digest_on neuro - вместе с кратким отчетом)\n"
+        "/digest_off - Не присылать отчет\n"
         "/help - Показать справку"
     )
 
-@bot.message_handler(commands=['help'])
-def help_command(message):
+@message_handler(commands=['help'])
+@instrumented
+async def help_command(message):
     logger.info(f"User {message.from_user.id} requested help")
-    bot.reply_to(
+    await bot.reply_to(
         message,
         "Доступные команды:\n"
         "/set_token - Установить токен Jira\n"
         "/remove_token - Удалить токен\n"
-        "/get_issue - Получить информацию о задаче\n"
+        "/get_issue - Получить информацию о задачах\n"
+        "/move - Перевести задачи в статус (/move PROJ-1 PROJ-2 Done)\n"
         "/worklog - Получить отчет о работе за последние 3 дня\n"
+        "/worklog_neuro - Краткий отчет о работе с помощью нейросети\n"
+        "/worklog_neuro refresh - Сгенерировать краткий отчет заново\n"
+        "/team_worklog - Отчет команды (/team_worklog neuro - с кратким отчетом нейросети)\n"
+        "/cancel - Отменить запрос к нейросети\n"
+        "/digest_on - Присылать отчет перед сдачей (/digest_on neuro - вместе с кратким отчетом)\n"
+        "/digest_off - Не присылать отчет\n"
         "/help - Показать справку"
     )
 
-@bot.message_handler(commands=['worklog'])
-def worklog_command(message):
+@message_handler(commands=['worklog'])
+@instrumented
+async def worklog_command(message):
     """Получение отчета о работе за последние 3 дня."""
     logger.info(f"User {message.from_user.id} requested worklog")
     
     # Проверяем наличие токена
-    db = get_db()
-    user = db.query(User).filter(User.telegram_id == message.from_user.id).first()
-    if not user or not user.jira_token:
+    token = await user_tokens.get(message.from_user.id)
+    if not token:
         logger.warning(f"User {message.from_user.id} has no token")
-        bot.reply_to(message, "❌ Токен не установлен. Используйте /set_token чтобы установить токен.")
+        await bot.reply_to(message, "❌ Токен не установлен. Используйте /set_token чтобы установить токен.")
         return
 
     try:
         # Получаем данные из Jira
         logger.debug(f"Getting worklog for user {message.from_user.id}")
-        jira = JiraService(token=user.jira_token)
-        worklog_entries = jira.get_recent_worklog(days=3)
+        jira = JiraService(token=token)
+        worklog_entries = await worklog_store.get_recent_worklog(message.from_user.id, jira)
 
-        # Форматируем и отправляем сообщение
-        response = format_worklog_message(worklog_entries)
-        try:
-            logger.debug("Sending formatted worklog message")
-            bot.reply_to(message, response, parse_mode="MarkdownV2", disable_web_page_preview=True)
-        except Exception as parse_error:
-            # Если возникла ошибка парсинга, отправляем без форматирования
-            logger.error(f"Error parsing markdown: {parse_error}")
-            bot.reply_to(message, response, disable_web_page_preview=True)
+        # Форматируем и отправляем сообщения; длинный отчет делится на части
+        logger.debug("Sending formatted worklog message")
+        await send_markdown_messages(
+            message.chat.id, format_worklog_messages(worklog_entries), reply_to_message_id=message.message_id
+        )
     except Exception as e:
         logger.error(f"Error getting worklog: {e}")
-        bot.reply_to(message, f"❌ Ошибка при получении отчета: {str(e)}")
+        await bot.reply_to(message, f"❌ Ошибка при получении отчета: {str(e)}")
 
-@bot.message_handler(commands=["worklog_neuro"])
-def worklog_neuro_command(message):
+@message_handler(commands=["worklog_neuro"])
+@instrumented
+async def worklog_neuro_command(message):
     """Получение отчета о работе за последние 3 дня с помощью нейросети."""
     logger.info(f"User {message.from_user.id} requested neuro worklog")
     
     # Проверяем наличие токена  
-    db = get_db()
-    user = db.query(User).filter(User.telegram_id == message.from_user.id).first()
-    if not user or not user.jira_token:
+    token = await user_tokens.get(message.from_user.id)
+    if not token:
         logger.warning(f"User {message.from_user.id} has no token")
-        bot.reply_to(
+        await bot.reply_to(
             message,
             "❌ Токен не установлен. Используйте /set_token чтобы установить токен."
         )
         return
 
+    if llm_queue.has_job(message.from_user.id):
+        await bot.reply_to(
+            message,
+            "⏳ Ваш запрос уже обрабатывается. Используйте /cancel чтобы отменить его."
+        )
+        return
+
     try:
         # Получаем данные из Jira
         logger.debug(f"Getting worklog for user {message.from_user.id}")
-        jira = JiraService(token=user.jira_token)
-        worklog_entries = jira.get_recent_worklog(days=3)
-
-        formatted_worklog = worklog_to_prompt(worklog_entries)
-        # Форматируем и отправляем сообщение
-        logger.debug("Sending worklog to neuro service")
-        message_wait = bot.reply_to(message, f"Отправляю данные в нейросеть.\nЭто может занять некоторое время...")
-        response = send_message(formatted_worklog)
-        bot.delete_message(message_wait.chat.id, message_wait.message_id)
-        bot.reply_to(message, response)
+        jira = JiraService(token=token)
+        worklog_entries = await worklog_store.get_recent_worklog(message.from_user.id, jira)
+
+        prompts = worklog_to_prompts(worklog_entries)
+        refresh = "refresh" in message.text.split()[1:]
+        await reply_with_neuro(message, prompts, refresh)
     except Exception as e:
         logger.error(f"Error getting neuro worklog: {e}")
-        bot.reply_to(message, f"❌ Ошибка при получении отчета: {str(e)}")
+        await bot.reply_to(message, f"❌ Ошибка при получении отчета: {str(e)}")
+
+async def reply_with_neuro(message, prompts: list, refresh: bool = False):
+    """
+    Отвечает на сообщение кратким отчетом нейросети по промптам.
+
+    Закэшированный ответ отправляется сразу, иначе запрос ставится в общую
+    очередь, а ответ выводится потоково в сообщение-заглушку.
+    """
+    # Закэшированный ответ отдаем сразу, без очереди
+    cached = None if refresh else await cached_summary(prompts)
+    if cached is not None:
+        for part in split_message(cached):
+            await bot.reply_to(message, part)
+        return
+
+    # Ставим запрос в очередь к нейросети
+    logger.debug("Sending worklog to neuro service")
+    message_wait = await bot.reply_to(message, NEURO_WAIT_TEXT)
+    queued = False
+    submitted = time.monotonic()
+
+    async def run():
+        LLM_QUEUE_WAIT.observe(time.monotonic() - submitted)
+        if queued:
+            await edit_message(message_wait, NEURO_WAIT_TEXT)
+        try:
+            await stream_to_message(
+                message_wait, await summarize(prompts, stream=True, refresh=refresh)
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error getting neuro worklog: {e}")
+            await edit_message(message_wait, f"❌ Ошибка при получении отчета: {str(e)}")
+
+    async def on_position(position):
+        nonlocal queued
+        queued = True
+        await edit_message(message_wait, f"⏳ Запрос в очереди, позиция: {position}")
+
+    async def on_cancel():
+        await edit_message(message_wait, "Запрос отменен.")
+
+    try:
+        position = llm_queue.submit(
+            Job(message.from_user.id, run, on_position=on_position, on_cancel=on_cancel)
+        )
+    except QueueFullError:
+        logger.warning(f"LLM queue is full, rejecting request of user {message.from_user.id}")
+        await edit_message(message_wait, "❌ Слишком много запросов к нейросети. Попробуйте позже.")
+        return
+    if position is None:
+        await edit_message(message_wait, "⏳ Ваш запрос уже обрабатывается.")
+    elif position:
+        await on_position(position)
+
+@message_handler(commands=['team_worklog'])
+@instrumented
+async def team_worklog_command(message):
+    """Сводный отчет команды: время по сотрудникам и задачам, по запросу с кратким отчетом нейросети."""
+    logger.info(f"User {message.from_user.id} requested team worklog")
+    if not settings.TEAM_MEMBERS:
+        await bot.reply_to(message, "❌ Состав команды не настроен (TEAM_MEMBERS).")
+        return
+    if settings.TEAM_LEAD_IDS and message.from_user.id not in settings.TEAM_LEAD_IDS | settings.ADMIN_IDS:
+        await bot.reply_to(message, "❌ Отчет команды доступен только руководителям.")
+        return
+
+    token = await user_tokens.get(message.from_user.id)
+    if not token:
+        logger.warning(f"User {message.from_user.id} has no token")
+        await bot.reply_to(message, "❌ Токен не установлен. Используйте /set_token чтобы установить токен.")
+        return
+
+    args = message.text.split()[1:]
+    neuro = "neuro" in args
+    if neuro and llm_queue.has_job(message.from_user.id):
+        await bot.reply_to(
+            message,
+            "⏳ Ваш запрос уже обрабатывается. Используйте /cancel чтобы отменить его."
+        )
+        return
+
+    try:
+        jira = JiraService(token=token)
+        team_entries = await jira.get_team_worklog(settings.TEAM_MEMBERS)
+        await send_markdown_messages(
+            message.chat.id, format_team_worklog_messages(team_entries), reply_to_message_id=message.message_id
+        )
+        if neuro and any(team_entries.values()):
+            await reply_with_neuro(message, team_worklog_to_prompts(team_entries), "refresh" in args)
+    except Exception as e:
+        logger.error(f"Error getting team worklog: {e}")
+        await bot.reply_to(message, f"❌ Ошибка при получении отчета команды: {str(e)}")
+
+@message_handler(commands=['cancel'])
+@instrumented
+async def cancel_command(message):
+    logger.info(f"User {message.from_user.id} requested neuro worklog cancellation")
+    if not await llm_queue.cancel(message.from_user.id):
+        await bot.reply_to(message, "❌ У вас нет запросов в обработке.")
 
-@bot.message_handler(commands=['set_token'])
-def set_token_command(message):
+@message_handler(commands=['digest_on'])
+@instrumented
+async def digest_on_command(message):
+    """Включает автоматическую отправку отчета перед сдачей."""
+    if not await user_tokens.get(message.from_user.id):
+        await bot.reply_to(message, "❌ Токен не установлен. Используйте /set_token чтобы установить токен.")
+        return
+    neuro = "neuro" in message.text.split()[1:]
+    await digest_scheduler.subscribe(message.from_user.id, message.chat.id, neuro)
+    await bot.reply_to(
+        message,
+        "✅ Отчет о работе будет приходить перед сдачей в понедельник, среду и пятницу"
+        + (" вместе с кратким отчетом нейросети." if neuro else ".")
+        + "\nОтключить: /digest_off"
+    )
+
+@message_handler(commands=['digest_off'])
+@instrumented
+async def digest_off_command(message):
+    if await digest_scheduler.unsubscribe(message.from_user.id):
+        await bot.reply_to(message, "✅ Автоматическая отправка отчета отключена.")
+    else:
+        await bot.reply_to(message, "❌ Автоматическая отправка отчета не была включена.")
+
+async def deliver_digest(chat_id: int, worklog_entries: dict, summary: str = None):
+    """Отправляет заранее подготовленный отчет подписавшемуся пользователю."""
+    try:
+        await bot.send_message(chat_id, "📬 Отчет о работе за текущий период:")
+        await send_markdown_messages(chat_id, format_worklog_messages(worklog_entries))
+        if summary:
+            for part in split_message(summary):
+                await bot.send_message(chat_id, part)
+    except ApiTelegramException as e:
+        logger.warning(f"Error delivering worklog digest to chat {chat_id}: {e}")
+
+@message_handler(commands=['stats'])
+@instrumented
+async def stats_command(message):
+    """Сводка метрик бота, доступна только администраторам."""
+    if message.from_user.id not in settings.ADMIN_IDS:
+        await bot.reply_to(message, "❌ Команда доступна только администраторам.")
+        return
+    for part in split_message(format_stats()):
+        await bot.reply_to(message, part)
+
+@message_handler(commands=['set_token'])
+@instrumented
+async def set_token_command(message):
     logger.info(f"User {message.from_user.id} initiated token setup")
     # Удаляем сообщение с командой для безопасности
-    bot.delete_message(message.chat.id, message.message_id)
+    await bot.delete_message(message.chat.id, message.message_id)
     
     # Проверяем, есть ли уже токен у пользователя
-    db = get_db()
-    user = db.query(User).filter(User.telegram_id == message.from_user.id).first()
-    if user and user.jira_token:
+    if await user_tokens.get(message.from_user.id):
         logger.info(f"User {message.from_user.id} already has a token")
-        bot.send_message(
+        await bot.send_message(
             message.chat.id,
             "У вас уже установлен токен. Хотите установить новый?\n"
             "Используйте /remove_token для удаления текущего токена, "
@@ -144,8 +424,8 @@ def set_token_command(message):
         )
         return
     
-    bot.set_state(message.from_user.id, UserStates.waiting_for_token, message.chat.id)
-    bot.send_message(
+    await bot.set_state(message.from_user.id, UserStates.waiting_for_token, message.chat.id)
+    await bot.send_message(
         message.chat.id,
         "Пожалуйста, отправьте ваш токен Jira.\n"
         "Его можно получить в настройках вашего аккаунта Jira:\n"
@@ -155,11 +435,12 @@ def set_token_command(message):
         "⚠️ Сообщение с токеном будет автоматически удалено для безопасности"
     )
 
-@bot.message_handler(state=UserStates.waiting_for_token)
-def process_token(message):
+@message_handler(state=UserStates.waiting_for_token)
+@instrumented
+async def process_token(message):
     logger.info(f"Processing token for user {message.from_user.id}")
     # Удаляем сообщение с токеном для безопасности
-    bot.delete_message(message.chat.id, message.message_id)
+    await bot.delete_message(message.chat.id, message.message_id)
     
     token = message.text.strip()
     
@@ -167,28 +448,25 @@ def process_token(message):
     try:
         logger.debug("Testing Jira connection")
         jira = JiraService(token=token)
-        if not jira.test_connection():
+        if not await jira.test_connection():
             logger.warning(f"Invalid token provided by user {message.from_user.id}")
-            bot.send_message(message.chat.id, "❌ Ошибка: неверный токен. Пожалуйста, проверьте токен и попробуйте снова.")
+            jira_clients.invalidate(token)
+            await bot.send_message(message.chat.id, "❌ Ошибка: неверный токен. Пожалуйста, проверьте токен и попробуйте снова.")
             return
         
         # Получаем информацию о пользователе для проверки
-        user_info = jira.client.myself()
+        user_info = await jira.client.myself()
         
         # Сохраняем токен в базу
         logger.debug("Saving token to database")
-        db = get_db()
-        user = db.query(User).filter(User.telegram_id == message.from_user.id).first()
-        if user:
-            user.jira_token = token
-        else:
-            user = User(telegram_id=message.from_user.id, jira_token=token)
-            db.add(user)
-        db.commit()
+        previous_token = await user_tokens.set(message.from_user.id, token)
+        if previous_token != token:
+            jira_clients.invalidate(previous_token)
+            await worklog_store.reset(message.from_user.id)
         
-        bot.delete_state(message.from_user.id, message.chat.id)
+        await bot.delete_state(message.from_user.id, message.chat.id)
         logger.info(f"Token successfully set for user {message.from_user.id}")
-        bot.send_message(
+        await bot.send_message(
             message.chat.id,
             f"✅ Токен успешно сохранен!\n"
             f"Вы авторизованы как: {user_info.get('displayName')}\n\n"
@@ -198,7 +476,7 @@ def process_token(message):
         )
     except Exception as e:
         logger.error(f"Error setting token for user {message.from_user.id}: {e}")
-        bot.send_message(
+        await bot.send_message(
             message.chat.id,
             "❌ Ошибка при проверке токена. Убедитесь, что:\n"
             "1. Токен введен правильно\n"
@@ -207,69 +485,176 @@ def process_token(message):
             "Попробуйте получить новый токен и установить его снова."
         )
 
-@bot.message_handler(commands=['remove_token'])
-def remove_token_command(message):
+@message_handler(commands=['remove_token'])
+@instrumented
+async def remove_token_command(message):
     logger.info(f"User {message.from_user.id} requested token removal")
-    db = get_db()
-    user = db.query(User).filter(User.telegram_id == message.from_user.id).first()
-    if user and user.jira_token:
-        user.jira_token = None
-        db.commit()
+    previous_token = await user_tokens.remove(message.from_user.id)
+    if previous_token:
+        jira_clients.invalidate(previous_token)
+        await worklog_store.reset(message.from_user.id)
         logger.info(f"Token removed for user {message.from_user.id}")
-        bot.reply_to(
+        await bot.reply_to(
             message,
             "✅ Токен успешно удален.\n"
             "Вы можете установить новый токен с помощью команды /set_token"
         )
     else:
         logger.warning(f"No token found for user {message.from_user.id}")
-        bot.reply_to(message, "❌ У вас не установлен токен.")
+        await bot.reply_to(message, "❌ У вас не установлен токен.")
+
+# Сколько задач можно запросить одним сообщением
+MAX_ISSUE_KEYS = 20
 
-@bot.message_handler(commands=['get_issue'])
-def get_issue_command(message):
+@message_handler(commands=['get_issue'])
+@instrumented
+async def get_issue_command(message):
     logger.info(f"User {message.from_user.id} initiated issue request")
-    bot.set_state(message.from_user.id, UserStates.waiting_for_issue_key, message.chat.id)
-    bot.reply_to(
+    # Ключи можно передать сразу: /get_issue PROJ-1 PROJ-2
+    args = message.text.partition(" ")[2]
+    if parse_issue_keys(args):
+        await reply_issues(message, args)
+        return
+    await bot.set_state(message.from_user.id, UserStates.waiting_for_issue_key, message.chat.id)
+    await bot.reply_to(
         message,
-        "Введите ключ задачи (например, PROJ-123):"
+        "Введите ключ задачи (например, PROJ-123) или несколько ключей через пробел:"
     )
 
-@bot.message_handler(state=UserStates.waiting_for_issue_key)
-def process_issue_key(message):
+@message_handler(state=UserStates.waiting_for_issue_key)
+@instrumented
+async def process_issue_key(message):
     logger.info(f"Processing issue key for user {message.from_user.id}")
-    issue_key = message.text.strip().upper()
+    await reply_issues(message, message.text)
+    await bot.delete_state(message.from_user.id, message.chat.id)
+
+async def reply_issues(message, text: str):
+    """Отвечает информацией о задачах, ключи которых есть в тексте."""
+    issue_keys = parse_issue_keys(text)
+    if not issue_keys:
+        await bot.reply_to(message, "❌ Не найден ключ задачи. Ключ выглядит так: PROJ-123")
+        return
+    if len(issue_keys) > MAX_ISSUE_KEYS:
+        await bot.reply_to(message, f"❌ Можно запросить не больше {MAX_ISSUE_KEYS} задач за раз.")
+        return
 
     # Проверяем наличие токена
-    db = get_db()
-    user = db.query(User).filter(User.telegram_id == message.from_user.id).first()
-    if not user or not user.jira_token:
+    token = await user_tokens.get(message.from_user.id)
+    if not token:
         logger.warning(f"User {message.from_user.id} has no token")
-        bot.reply_to(message, "❌ Токен не установлен. Используйте /set_token чтобы установить токен.")
-        bot.delete_state(message.from_user.id, message.chat.id)
+        await bot.reply_to(message, "❌ Токен не установлен. Используйте /set_token чтобы установить токен.")
         return
 
     try:
-        logger.debug(f"Getting issue {issue_key}")
-        jira = JiraService(token=user.jira_token)
-        issue = jira.get_issue(issue_key)
-
-        response = format_issue_message(
-            issue_key=issue.key,
-            summary=issue.fields.summary,
-            status=issue.fields.status.name
+        logger.debug(f"Getting issues {issue_keys}")
+        jira = JiraService(token=token)
+        issues = await jira.get_issues(issue_keys)
+
+        parts = [
+            format_issue_message(
+                issue_key=issue["key"],
+                summary=issue["fields"]["summary"],
+                status=issue["fields"]["status"]["name"]
+            )
+            for issue in issues.values()
+        ]
+        not_found = [key for key in issue_keys if key not in issues]
+        if not_found:
+            parts.append(escape_markdown(f"❌ Задачи не найдены или нет доступа: {', '.join(not_found)}"))
+        # Делим по строкам: экранирование и ссылки не выходят за пределы строки
+        await send_markdown_messages(
+            message.chat.id, split_message("\n\n".join(parts)), reply_to_message_id=message.message_id
         )
-        bot.reply_to(message, response, parse_mode="Markdown")
-        logger.info(f"Issue {issue_key} successfully retrieved")
-    except JIRAError as e:
-        logger.error(f"Jira error getting issue {issue_key}: {e.text}")
-        bot.reply_to(message, f"❌ Ошибка при получении задачи: {e.text}")
+        logger.info(f"Issues {list(issues)} successfully retrieved")
+    except JiraError as e:
+        logger.error(f"Jira error getting issues {issue_keys}: {e.text}")
+        await bot.reply_to(message, f"❌ Ошибка при получении задачи: {e.text}")
+    except Exception as e:
+        logger.error(f"Error getting issues {issue_keys}: {e}")
+        await bot.reply_to(message, f"❌ Ошибка при получении задачи: {str(e)}")
+
+# Сколько задач можно перевести в другой статус одной командой
+MAX_MOVE_KEYS = 50
+
+@message_handler(commands=['move'])
+@instrumented
+async def move_command(message):
+    """Перевод нескольких задач в статус: /move PROJ-1 PROJ-2 Done"""
+    logger.info(f"User {message.from_user.id} requested status change")
+    issue_keys, status_name = split_issue_keys(message.text.partition(" ")[2])
+    if not issue_keys or not status_name:
+        await bot.reply_to(message, "❌ Укажите задачи и статус, например: /move PROJ-1 PROJ-2 Done")
+        return
+    if len(issue_keys) > MAX_MOVE_KEYS:
+        await bot.reply_to(message, f"❌ Можно перевести не больше {MAX_MOVE_KEYS} задач за раз.")
+        return
+
+    token = await user_tokens.get(message.from_user.id)
+    if not token:
+        logger.warning(f"User {message.from_user.id} has no token")
+        await bot.reply_to(message, "❌ Токен не установлен. Используйте /set_token чтобы установить токен.")
+        return
+
+    try:
+        results = await JiraService(token=token).update_issues_status(issue_keys, status_name)
+    except JiraError as e:
+        logger.error(f"Jira error moving issues {issue_keys}: {e.text}")
+        await bot.reply_to(message, f"❌ Ошибка при смене статуса: {e.text}")
+        return
     except Exception as e:
-        logger.error(f"Error getting issue {issue_key}: {e}")
-        bot.reply_to(message, f"❌ Ошибка при получении задачи: {str(e)}")
+        logger.error(f"Error moving issues {issue_keys}: {e}")
+        await bot.reply_to(message, f"❌ Ошибка при смене статуса: {str(e)}")
+        return
 
-    bot.delete_state(message.from_user.id, message.chat.id)
+    reasons = {
+        NOT_FOUND: "задача не найдена или нет доступа",
+        NO_TRANSITION: f"нет перехода в статус «{status_name}»",
+    }
+    moved = [key for key, error in results.items() if error is None]
+    lines = [f"Статус «{status_name}»: переведено {len(moved)} из {len(results)}"]
+    lines.extend(f"✅ {key}" for key in moved)
+    lines.extend(
+        f"❌ {key}: {reasons.get(error, error)}" for key, error in results.items() if error is not None
+    )
+    for part in split_message("\n".join(lines)):
+        await bot.reply_to(message, part)
+    logger.info(f"User {message.from_user.id} moved {len(moved)} of {len(results)} issues to {status_name}")
+
+def log_task_failure(task: asyncio.Task):
+    """Пишет в лог исключение, с которым завершилась фоновая задача."""
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background task {task.get_name()} failed", exc_info=task.exception())
+
+async def run_bot():
+    """Асинхронный цикл работы бота"""
+    asyncio.create_task(warm_up())
+    metrics_runner = await run_metrics_server() if settings.METRICS_PORT else None
+    digest_task = None
+    if settings.DIGEST_ENABLED:
+        digest_task = asyncio.create_task(digest_scheduler.run(deliver_digest), name="worklog-digest")
+        digest_task.add_done_callback(log_task_failure)
+    # С одним хостом Ollama выбирать не из чего, опрашивать его незачем
+    probe_task = asyncio.create_task(ollama_router.run_probes()) if len(ollama_router.hosts) > 1 else None
+    try:
+        if settings.BOT_MODE == "webhook":
+            await run_webhook(bot)
+        else:
+            # Telegram не отдает обновления через getUpdates, пока установлен вебхук
+            await bot.remove_webhook()
+            await bot.infinity_polling()
+    finally:
+        if digest_task is not None:
+            digest_task.cancel()
+        if probe_task is not None:
+            probe_task.cancel()
+        await llm_queue.close()
+        await jira_clients.aclose()
+        if isinstance(state_storage, PersistentStateStorage):
+            await state_storage.close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
 
 def start_bot():
     """Запуск бота"""
     logger.info("Starting bot")
-    bot.infinity_polling()
+    asyncio.run(run_bot())
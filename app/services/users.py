@@ -0,0 +1,90 @@
+import asyncio
+import time
+from typing import Optional
+
+from app.core.config import settings
+from app.core.database import User, session_scope
+
+
+class UserTokenCache:
+    """
+    Jira tokens of bot users with an in-memory TTL cache.
+
+    Token lookups happen on every command, so they are served from memory;
+    the cache entry is replaced whenever the token is set or removed. Other
+    replicas of the bot only see the change when their entry expires, so the
+    TTL is kept short. Database access runs in a worker thread.
+    """
+
+    def __init__(self, ttl: int):
+        """
+        Args:
+            ttl (int): Lifetime of a cached lookup in seconds
+        """
+        self.ttl = ttl
+        self._cache = {}  # telegram_id -> (token, expires at)
+
+    async def get(self, telegram_id: int) -> Optional[str]:
+        """Get the Jira token of the user, or None if it is not set."""
+        cached = self._cache.get(telegram_id)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+
+        token = await asyncio.to_thread(self._load, telegram_id)
+        self._remember(telegram_id, token)
+        return token
+
+    @staticmethod
+    def _load(telegram_id: int) -> Optional[str]:
+        with session_scope() as db:
+            user = db.query(User).filter(User.telegram_id == telegram_id).first()
+            return user.jira_token if user else None
+
+    async def set(self, telegram_id: int, token: str) -> Optional[str]:
+        """
+        Save the Jira token of the user.
+
+        Returns:
+            Optional[str]: Previous token of the user
+        """
+        previous = await asyncio.to_thread(self._store, telegram_id, token)
+        self._remember(telegram_id, token)
+        return previous
+
+    @staticmethod
+    def _store(telegram_id: int, token: str) -> Optional[str]:
+        with session_scope() as db:
+            user = db.query(User).filter(User.telegram_id == telegram_id).first()
+            if user:
+                previous = user.jira_token
+                user.jira_token = token
+            else:
+                previous = None
+                db.add(User(telegram_id=telegram_id, jira_token=token))
+        return previous
+
+    async def remove(self, telegram_id: int) -> Optional[str]:
+        """
+        Remove the Jira token of the user.
+
+        Returns:
+            Optional[str]: Removed token, or None if the user had no token
+        """
+        previous = await asyncio.to_thread(self._clear, telegram_id)
+        self._remember(telegram_id, None)
+        return previous
+
+    @staticmethod
+    def _clear(telegram_id: int) -> Optional[str]:
+        with session_scope() as db:
+            user = db.query(User).filter(User.telegram_id == telegram_id).first()
+            previous = user.jira_token if user else None
+            if previous:
+                user.jira_token = None
+        return previous
+
+    def _remember(self, telegram_id: int, token: Optional[str]):
+        self._cache[telegram_id] = (token, time.monotonic() + self.ttl)
+
+
+user_tokens = UserTokenCache(ttl=settings.USER_CACHE_TTL)
@@ -0,0 +1,65 @@
+import asyncio
+import hmac
+import logging
+
+from aiohttp import web
+from telebot import types
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def create_app(bot) -> web.Application:
+    """
+    Create an aiohttp application receiving Telegram updates.
+
+    Updates are acknowledged immediately and processed in background tasks,
+    so a slow handler never makes Telegram retry the delivery.
+    """
+    tasks = set()
+
+    async def handle_update(request: web.Request) -> web.Response:
+        secret = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(secret, settings.WEBHOOK_SECRET):
+            logger.warning(f"Rejected webhook request from {request.remote}: invalid secret token")
+            return web.Response(status=403)
+
+        try:
+            update = types.Update.de_json(await request.json())
+        except Exception as e:
+            logger.error(f"Error parsing webhook update: {e}")
+            return web.Response(status=400)
+
+        task = asyncio.create_task(bot.process_new_updates([update]))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(settings.WEBHOOK_PATH, handle_update)
+    return app
+
+
+async def run_webhook(bot):
+    """Register the webhook in Telegram and serve updates until cancelled."""
+    if not settings.WEBHOOK_URL or not settings.WEBHOOK_SECRET:
+        raise ValueError("WEBHOOK_URL and WEBHOOK_SECRET must be set in webhook mode")
+
+    runner = web.AppRunner(create_app(bot))
+    await runner.setup()
+    site = web.TCPSite(runner, settings.WEBHOOK_HOST, settings.WEBHOOK_PORT)
+    await site.start()
+    logger.info(f"Webhook server is listening on {settings.WEBHOOK_HOST}:{settings.WEBHOOK_PORT}")
+
+    try:
+        await bot.set_webhook(
+            url=settings.WEBHOOK_URL.rstrip("/") + settings.WEBHOOK_PATH,
+            secret_token=settings.WEBHOOK_SECRET,
+        )
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await bot.close_session()
@@ -0,0 +1,338 @@
+import asyncio
+import logging
+import time
+import weakref
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import settings
+from app.core.database import Worklog, WorklogAuthor, WorklogFeedState, WorklogPending, session_scope
+from app.services.jira import JiraService, get_worklog_period_days
+
+logger = logging.getLogger(__name__)
+
+# Единственная строка состояния общей ленты изменений
+FEED_STATE_ID = 1
+
+
+class WorklogStore:
+    """
+    Local copy of the users' worklogs, kept current by incremental sync.
+
+    A new user is backfilled once with a search limited to their own worklogs.
+    After that, one shared watermark on Jira's "worklogs updated/deleted since"
+    feed keeps all users current: changed worklogs are downloaded once and
+    assigned locally to the bot users who authored them, so Jira load does not
+    grow with the number of users.
+
+    The feed is read with the token of the user whose request triggers the
+    sync. Changed worklogs that this token cannot see (or whose issue it cannot
+    see) are kept as pending, and every user checks the pending worklogs once
+    with their own token, so worklogs in projects hidden from some users are
+    not lost when the shared watermark moves on.
+    """
+
+    def __init__(self, initial_days: int, sync_interval: int):
+        """
+        Args:
+            initial_days (int): How many days back the backfill of a new user starts
+            sync_interval (int): Minimum number of seconds between syncs of the feed
+        """
+        self.initial_days = initial_days
+        self.sync_interval = timedelta(seconds=sync_interval)
+        self._locks = weakref.WeakValueDictionary()  # telegram id -> lock, пока он кем-то используется
+        self._feed_lock = asyncio.Lock()
+
+    async def sync(self, telegram_id: int, jira: JiraService, force: bool = False, feed: bool = True):
+        """
+        Bring the worklogs of the user up to date.
+
+        With feed=False the shared feed is not read, e.g. right after sync_feed;
+        the user is still backfilled and checks the pending worklogs.
+        """
+        requested = datetime.utcnow()
+        lock = self._locks.get(telegram_id)
+        if lock is None:
+            lock = self._locks[telegram_id] = asyncio.Lock()
+        async with lock:
+            if not await asyncio.to_thread(self._has_author, telegram_id):
+                await self._backfill(telegram_id, jira)
+            if feed:
+                await self._sync_feed(jira, requested, force)
+            await self._resolve_pending(telegram_id, jira)
+
+    async def sync_feed(self, jira: JiraService):
+        """Apply the worklog changes of all users now, reading the feed with this token."""
+        await self._sync_feed(jira, datetime.utcnow(), force=True)
+
+    async def _backfill(self, telegram_id: int, jira: JiraService):
+        """Download the recent worklogs of a user the store does not know yet."""
+        started = int(time.time() * 1000)
+        me = await jira.client.current_user()
+        jql = f"worklogAuthor = currentUser() AND worklogDate >= startOfDay(-{self.initial_days})"
+        worklogs = []
+        summaries = {}
+        async for issues in jira.search_pages(jql, fields="summary,worklog"):
+            worklogs_by_issue = await jira._issue_worklogs(issues)
+            for issue in issues:
+                summaries[issue["id"]] = (issue["key"], issue["fields"]["summary"])
+                worklogs.extend(
+                    worklog
+                    for worklog in worklogs_by_issue[issue["key"]]
+                    if JiraService._is_author(worklog["author"], me)
+                )
+        await asyncio.to_thread(self._save_backfill, telegram_id, me, worklogs, summaries, started)
+        logger.info(f"Backfilled {len(worklogs)} worklogs of user {telegram_id}")
+
+    def _save_backfill(self, telegram_id: int, author: str, worklogs: list, summaries: dict, started: int):
+        now = datetime.utcnow()
+        with session_scope() as db:
+            db.query(Worklog).filter(Worklog.telegram_id == telegram_id).delete()
+            for worklog in worklogs:
+                db.add(self._row(telegram_id, worklog, summaries))
+            # Отложенные до начала загрузки ворклоги уже вошли в нее
+            db.merge(WorklogAuthor(telegram_id=telegram_id, author=author, pending_since=started))
+        try:
+            # Лента начинается с первой загрузки; изменения после нее подхватит общая синхронизация
+            with session_scope() as db:
+                if db.get(WorklogFeedState, FEED_STATE_ID) is None:
+                    db.add(WorklogFeedState(id=FEED_STATE_ID, since=started, synced_at=now))
+        except IntegrityError:
+            # Ленту одновременно создал другой экземпляр бота
+            pass
+
+    async def _sync_feed(self, jira: JiraService, requested: datetime, force: bool):
+        """Apply worklog changes since the shared watermark to all users."""
+        async with self._feed_lock:
+            feed = await asyncio.to_thread(self._load_feed)
+            if feed is None:
+                return
+            # Пока ждали блокировку, ленту уже синхронизировали по более позднему запросу
+            if feed.synced_at >= requested:
+                return
+            if not force and requested - feed.synced_at < self.sync_interval:
+                return
+
+            now = datetime.utcnow()
+            # Сначала получаем изменения из Jira, затем одной транзакцией пишем их в базу
+            updated_ids, updated_until = await jira.client.updated_worklogs(feed.since)
+            deleted_ids, deleted_until = await jira.client.deleted_worklogs(feed.since)
+            authors = await asyncio.to_thread(self._load_authors)
+            worklogs = await jira.client.worklogs_by_ids(updated_ids)
+            owned = [worklog for worklog in worklogs if self._owners(worklog, authors)]
+            summaries = await self._issue_summaries(jira, {worklog["issueId"] for worklog in owned})
+
+            # Ворклоги и задачи, скрытые от этого токена, проверят токены остальных пользователей
+            found = {int(worklog["id"]) for worklog in worklogs}
+            pending = [int(i) for i in updated_ids if int(i) not in found]
+            pending += [int(worklog["id"]) for worklog in owned if worklog["issueId"] not in summaries]
+            worklogs = [worklog for worklog in worklogs if int(worklog["id"]) not in pending]
+
+            saved = await asyncio.to_thread(
+                self._apply_feed, worklogs, authors, summaries, deleted_ids, pending,
+                min(updated_until, deleted_until), now,
+            )
+            logger.info(
+                f"Synced worklog feed: {len(updated_ids)} updated ({saved} of bot users, "
+                f"{len(pending)} pending), {len(deleted_ids)} deleted"
+            )
+
+    @staticmethod
+    def _load_feed() -> WorklogFeedState:
+        with session_scope() as db:
+            return db.get(WorklogFeedState, FEED_STATE_ID)
+
+    @staticmethod
+    def _load_authors() -> dict:
+        """Jira user -> Telegram ids of the bot users logged in as that user."""
+        authors = {}
+        with session_scope() as db:
+            for row in db.query(WorklogAuthor):
+                authors.setdefault(row.author, []).append(row.telegram_id)
+        return authors
+
+    @staticmethod
+    def _owners(worklog: dict, authors: dict) -> list:
+        author = worklog["author"]
+        return authors.get(author.get("accountId")) or authors.get(author.get("name")) or []
+
+    def _apply_feed(
+        self, worklogs: list, authors: dict, summaries: dict, deleted_ids: list, pending: list,
+        since: int, now: datetime,
+    ) -> int:
+        saved = 0
+        seen_at = int(time.time() * 1000)
+        with session_scope() as db:
+            # Измененные ворклоги записываем заново: у них мог смениться автор
+            changed = [int(worklog["id"]) for worklog in worklogs] + [int(i) for i in deleted_ids]
+            for i in range(0, len(changed), 500):
+                db.query(Worklog).filter(Worklog.worklog_id.in_(changed[i:i + 500])).delete(
+                    synchronize_session=False
+                )
+            for worklog in worklogs:
+                for telegram_id in self._owners(worklog, authors):
+                    db.add(self._row(telegram_id, worklog, summaries))
+                    saved += 1
+            self._delete_pending(db, [int(worklog["id"]) for worklog in worklogs] + [int(i) for i in deleted_ids])
+            for worklog_id in pending:
+                db.merge(WorklogPending(worklog_id=worklog_id, seen_at=seen_at))
+            # Старше периода первой загрузки ворклоги в отчеты уже не попадут
+            cutoff = seen_at - self.initial_days * 86400 * 1000
+            db.query(WorklogPending).filter(WorklogPending.seen_at < cutoff).delete(synchronize_session=False)
+            db.merge(WorklogFeedState(id=FEED_STATE_ID, since=since, synced_at=now))
+        return saved
+
+    @staticmethod
+    def _delete_pending(db, worklog_ids: list):
+        for i in range(0, len(worklog_ids), 500):
+            db.query(WorklogPending).filter(WorklogPending.worklog_id.in_(worklog_ids[i:i + 500])).delete(
+                synchronize_session=False
+            )
+
+    async def _resolve_pending(self, telegram_id: int, jira: JiraService):
+        """Check the pending worklogs the user has not checked yet with the user's own token."""
+        checked_until, ids = await asyncio.to_thread(self._load_pending, telegram_id)
+        if not ids:
+            return
+        authors = await asyncio.to_thread(self._load_authors)
+        worklogs = [
+            worklog for worklog in await jira.client.worklogs_by_ids(ids)
+            if telegram_id in self._owners(worklog, authors)
+        ]
+        summaries = await self._issue_summaries(jira, {worklog["issueId"] for worklog in worklogs})
+        worklogs = [worklog for worklog in worklogs if worklog["issueId"] in summaries]
+        await asyncio.to_thread(self._apply_pending, telegram_id, worklogs, authors, summaries, checked_until)
+        logger.info(f"Checked {len(ids)} pending worklogs for user {telegram_id}: {len(worklogs)} found")
+
+    @staticmethod
+    def _load_pending(telegram_id: int) -> tuple:
+        """Pending worklogs seen after the user's last check: (latest seen_at, worklog ids)."""
+        with session_scope() as db:
+            author = db.get(WorklogAuthor, telegram_id)
+            if author is None:
+                return None, []
+            rows = db.query(WorklogPending).filter(WorklogPending.seen_at > author.pending_since).all()
+            if not rows:
+                return None, []
+            return max(row.seen_at for row in rows), [row.worklog_id for row in rows]
+
+    def _apply_pending(self, telegram_id: int, worklogs: list, authors: dict, summaries: dict, checked_until: int):
+        with session_scope() as db:
+            resolved = [int(worklog["id"]) for worklog in worklogs]
+            for i in range(0, len(resolved), 500):
+                db.query(Worklog).filter(Worklog.worklog_id.in_(resolved[i:i + 500])).delete(
+                    synchronize_session=False
+                )
+            for worklog in worklogs:
+                for owner in self._owners(worklog, authors):
+                    db.add(self._row(owner, worklog, summaries))
+            self._delete_pending(db, resolved)
+            author = db.get(WorklogAuthor, telegram_id)
+            if author is not None:
+                author.pending_since = max(author.pending_since, checked_until)
+
+    @staticmethod
+    async def _issue_summaries(jira: JiraService, issue_ids: set) -> dict:
+        """Get issue keys and summaries by issue id."""
+        summaries = {}
+        ids = sorted(issue_ids)
+        for i in range(0, len(ids), 100):
+            chunk = ids[i:i + 100]
+            # validateQuery=warn: удаленные и недоступные задачи не делают весь запрос ошибочным
+            issues = await jira.client.search_issues(
+                f"id in ({','.join(chunk)})", max_results=len(chunk), fields="summary", validate_query="warn"
+            )
+            for issue in issues:
+                summaries[issue["id"]] = (issue["key"], issue["fields"]["summary"])
+        return summaries
+
+    @staticmethod
+    def _row(telegram_id: int, worklog: dict, summaries: dict) -> Worklog:
+        issue_key, issue_summary = summaries[worklog["issueId"]]
+        return Worklog(
+            telegram_id=telegram_id,
+            worklog_id=int(worklog["id"]),
+            issue_id=int(worklog["issueId"]),
+            issue_key=issue_key,
+            issue_summary=issue_summary,
+            started=worklog["started"],
+            started_date=datetime.strptime(worklog["started"][:10], "%Y-%m-%d").date(),
+            time_spent=worklog["timeSpent"],
+            time_spent_seconds=worklog["timeSpentSeconds"],
+            comment=worklog.get("comment", ""),
+            author=worklog["author"]["displayName"],
+            created=worklog["created"],
+            updated=worklog["updated"],
+        )
+
+    async def get_recent_worklog(self, telegram_id: int, jira: JiraService) -> dict:
+        """
+        Get worklog entries of the user for the current period from the local store.
+
+        Catches up with Jira first; if Jira is unavailable, previously synced data is used.
+
+        Returns:
+            dict: Dictionary with issue keys as keys and worklog entries as values
+        """
+        try:
+            await self.sync(telegram_id, jira)
+        except Exception as e:
+            if not await asyncio.to_thread(self._has_author, telegram_id):
+                raise
+            logger.warning(f"Error syncing worklogs of user {telegram_id}, using local data: {e}")
+
+        return await self.recent_entries(telegram_id)
+
+    async def recent_entries(self, telegram_id: int) -> dict:
+        """Get worklog entries of the user for the current period from the local store, without syncing."""
+        return await asyncio.to_thread(self._recent_entries, telegram_id)
+
+    @staticmethod
+    def _recent_entries(telegram_id: int) -> dict:
+        today = datetime.now()
+        days_ago = today - timedelta(days=get_worklog_period_days(today))
+
+        with session_scope() as db:
+            rows = (
+                db.query(Worklog)
+                .filter(Worklog.telegram_id == telegram_id, Worklog.started_date >= days_ago.date())
+                .order_by(Worklog.started.desc())
+                .all()
+            )
+
+        worklog_entries = {}
+        for row in rows:
+            worklog_entries.setdefault(row.issue_key, []).append({
+                "issue_key": row.issue_key,
+                "issue_summary": row.issue_summary,
+                "date": row.started,
+                "time_spent": row.time_spent,
+                "time_spent_seconds": row.time_spent_seconds,
+                "comment": row.comment,
+                "author": row.author,
+                "created": row.created,
+                "updated": row.updated,
+            })
+        return worklog_entries
+
+    @staticmethod
+    def _has_author(telegram_id: int) -> bool:
+        with session_scope() as db:
+            return db.get(WorklogAuthor, telegram_id) is not None
+
+    async def reset(self, telegram_id: int):
+        """Drop the local worklogs of the user, e.g. when the token changes."""
+        await asyncio.to_thread(self._reset, telegram_id)
+
+    @staticmethod
+    def _reset(telegram_id: int):
+        with session_scope() as db:
+            db.query(Worklog).filter(Worklog.telegram_id == telegram_id).delete()
+            db.query(WorklogAuthor).filter(WorklogAuthor.telegram_id == telegram_id).delete()
+
+
+worklog_store = WorklogStore(
+    initial_days=settings.WORKLOG_SYNC_INITIAL_DAYS,
+    sync_interval=settings.WORKLOG_SYNC_INTERVAL,
+)
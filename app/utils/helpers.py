@@ -1,58 +1,320 @@
 from datetime import datetime
 from app.core.config import settings
 import json
+import re
+
+# Максимальная длина сообщения Telegram
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# Символы, которые нужно экранировать в MarkdownV2 (включая сам обратный слэш)
+_MARKDOWN_SPECIAL = re.compile(r"[\\_*\[\]()~`>#+\-=|{}.!]")
+
+WORKLOG_SEPARATOR = "─────────────────\n"
+
+_ISSUE_KEY = re.compile(r"\b[A-Z][A-Z0-9_]*-\d+\b")
+
+# Номер пункта в ответе нейросети: "1." или "1.1" в начале строки
+_SUMMARY_ITEM = re.compile(r"^([ \t]*)(\d+)(?=\.)", re.M)
+
+# Примерно столько символов русского текста приходится на один токен
+CHARS_PER_TOKEN = 3
+
 
 def format_datetime(dt: datetime) -> str:
     """Format datetime to string."""
     return dt.strftime("%Y-%m-%d %H:%M:%S")
 
 
+def _escape_match(match) -> str:
+    return "\\" + match.group()
+
+
 def escape_markdown(text: str) -> str:
-    """Экранирование специальных символов для MarkdownV2."""
-    special_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
-    for char in special_chars:
-        text = text.replace(char, f'\\{char}')
-    return text
-
-def format_worklog_message(worklog_entries: dict) -> str:
-    """Форматирование сообщения с отчетом о работе."""
-    if not worklog_entries:
-        return "За последние 3 дня нет записей о работе\\."
+    """Экранирование специальных символов для MarkdownV2 за один проход."""
+    return _MARKDOWN_SPECIAL.sub(_escape_match, text)
+
+
+def _truncate_markdown(text: str, limit: int) -> str:
+    """Обрезает экранированный текст, не разрывая escape-последовательность."""
+    if len(text) <= limit:
+        return text
+    text = text[:limit - 1]
+    # Нечетное число слэшей в конце означает оборванную последовательность
+    trailing = len(text) - len(text.rstrip("\\"))
+    if trailing % 2:
+        text = text[:-1]
+    return text + "…"
+
+
+def format_jira_date(dt_str: str) -> str:
+    """Форматирует дату Jira как "дд-мм-гг чч:мм" (с экранированием для MarkdownV2)."""
+    # Быстрый путь для ISO-формата Jira: 2024-01-31T10:00:00.000+0300
+    if len(dt_str) >= 16 and dt_str[4] == "-" and dt_str[10] in "T ":
+        return f"{dt_str[8:10]}\\-{dt_str[5:7]}\\-{dt_str[2:4]} {dt_str[11:16]}"
+    return parse_jira_datetime(dt_str).strftime("%d\\-%m\\-%y %H:%M")
+
 
-    message = "📊 *Отчет о затраченном времени за последние 3 дня*\n\n"
+def _worklog_blocks(worklog_entries: dict, limit: int):
+    """
+    Разбивает отчет на неделимые блоки MarkdownV2.
 
+    Yields:
+        tuple: (заголовок задачи, текст блока); заголовок повторяется, если
+            записи задачи продолжаются в следующем сообщении
+    """
     for issue_key, entries in worklog_entries.items():
         safe_issue_key = escape_markdown(issue_key)
         safe_url = escape_markdown(f"{settings.JIRA_URL}/browse/{issue_key}")
         safe_summary = escape_markdown(entries[0]['issue_summary'])
-        
-        message += f"🔹 *Задача:* [{safe_issue_key}]({safe_url})\n"
-        message += f"*Название:* {safe_summary}\n\n"
+        header = f"🔹 *Задача:* [{safe_issue_key}]({safe_url})\n*Название:* {safe_summary}\n\n"
+        yield None, header
 
         for entry in entries:
-            date = parse_jira_datetime(entry["date"]).strftime("%d\\-%m\\-%y %H:%M")
-            safe_time_spent = escape_markdown(entry['time_spent'])
-            message += f"⏰ {date}\n"
-            message += f"⌛️ *Затрачено:* {safe_time_spent}\n"
+            parts = [
+                f"⏰ {format_jira_date(entry['date'])}\n",
+                f"⌛️ *Затрачено:* {escape_markdown(entry['time_spent'])}\n",
+            ]
             if entry["comment"]:
-                safe_comment = escape_markdown(entry['comment'])
-                message += f"💬 *Комментарий:*\n{safe_comment}\n"
-            message += "\n"
+                # Одна запись должна помещаться в сообщение вместе с заголовком задачи
+                safe_comment = _truncate_markdown(
+                    escape_markdown(entry['comment']), limit - len(header) - 200
+                )
+                parts.append(f"💬 *Комментарий:*\n{safe_comment}\n")
+            parts.append("\n")
+            yield header, "".join(parts)
 
-        message += "─────────────────\n"
+        yield None, WORKLOG_SEPARATOR
 
-    return message
 
-def worklog_to_prompt(worklog_entries: dict) -> str:
-    """Convert worklog entries to a prompt for the neuro service."""
-    message = ""
-    for issue_key, entries in worklog_entries.items():
-        message += f"*Задача ({issue_key}):* {entries[0]['issue_summary']} \n"
-        for entry in entries:
-            if entry["comment"]:
-                message += f"{entry['comment']}\n"
-            message += "\n"
-    return message
+def format_worklog_messages(worklog_entries: dict, limit: int = TELEGRAM_MESSAGE_LIMIT) -> list:
+    """
+    Форматирование отчета о работе в сообщения MarkdownV2.
+
+    Отчет делится на сообщения не длиннее limit по границам записей, поэтому
+    каждое сообщение остается корректным MarkdownV2.
+
+    Returns:
+        list: Список текстов сообщений
+    """
+    if not worklog_entries:
+        return ["За последние 3 дня нет записей о работе\\."]
+
+    messages = []
+    current = ["📊 *Отчет о затраченном времени за последние 3 дня*\n\n"]
+    length = len(current[0])
+
+    for header, block in _worklog_blocks(worklog_entries, limit):
+        if length + len(block) > limit:
+            if header is not None and current and current[-1] is header:
+                # Не оставляем заголовок задачи без записей в конце сообщения
+                current.pop()
+            messages.append("".join(current))
+            current = []
+            length = 0
+            if block == WORKLOG_SEPARATOR:
+                continue
+            if header is not None:
+                current.append(header)
+                length = len(header)
+        current.append(block)
+        length += len(block)
+
+    if current:
+        messages.append("".join(current))
+    return messages
+
+
+def split_message(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> list:
+    """Делит простой текст на части не длиннее limit, по возможности по границам строк."""
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = limit
+        parts.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    if text:
+        parts.append(text)
+    return parts
+
+
+def format_duration(seconds: int) -> str:
+    """Форматирует длительность как "3ч 30м"."""
+    hours, minutes = divmod(round(seconds / 60), 60)
+    if hours and minutes:
+        return f"{hours}ч {minutes}м"
+    return f"{hours}ч" if hours else f"{minutes}м"
+
+
+def format_team_worklog_messages(team_entries: dict, limit: int = TELEGRAM_MESSAGE_LIMIT) -> list:
+    """
+    Форматирование сводного отчета команды в сообщения MarkdownV2.
+
+    Для каждого сотрудника выводится общее время и время по задачам;
+    сообщения делятся по границам строк.
+
+    Args:
+        team_entries (dict): Автор -> ворклоги в формате get_recent_worklog
+
+    Returns:
+        list: Список текстов сообщений
+    """
+    lines = ["👥 *Отчет команды о затраченном времени*"]
+    team_total = 0
+    for author, worklog_entries in team_entries.items():
+        totals = {
+            issue_key: sum(entry["time_spent_seconds"] for entry in entries)
+            for issue_key, entries in worklog_entries.items()
+        }
+        total = sum(totals.values())
+        team_total += total
+        name = next((e[0]["author"] for e in worklog_entries.values()), author)
+        lines.append(f"\n👤 *{escape_markdown(name)}* — {escape_markdown(format_duration(total))}")
+        for issue_key, seconds in sorted(totals.items(), key=lambda item: -item[1]):
+            safe_url = escape_markdown(f"{settings.JIRA_URL}/browse/{issue_key}")
+            safe_summary = escape_markdown(worklog_entries[issue_key][0]["issue_summary"])
+            lines.append(
+                f"  • [{escape_markdown(issue_key)}]({safe_url}) {safe_summary} — "
+                f"{escape_markdown(format_duration(seconds))}"
+            )
+        if not worklog_entries:
+            lines.append("  нет записей о работе")
+    lines.append(f"\n*Итого:* {escape_markdown(format_duration(team_total))}")
+
+    messages = []
+    current = ""
+    for line in lines:
+        if current and len(current) + len(line) + 1 > limit:
+            messages.append(current)
+            current = ""
+        current += line + "\n"
+    if current:
+        messages.append(current)
+    return messages
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate number of tokens in the text without loading a tokenizer."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut the text to about max_tokens tokens at a word boundary."""
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    if " " in cut:
+        cut = cut.rsplit(" ", 1)[0]
+    return cut.rstrip(" ,.;:\n") + "…"
+
+
+def _issue_prompt(issue_key: str, entries: list, max_tokens: int, comment_tokens: int) -> str:
+    """
+    Prompt block of one issue.
+
+    Repeated comments are written once and long comments are trimmed. Entries
+    are newest first, so if the block does not fit into max_tokens the oldest
+    entries are dropped.
+    """
+    parts = [f"*Задача ({issue_key}):* {entries[0]['issue_summary']} \n"]
+    size = estimate_tokens(parts[0])
+    seen = set()
+    for entry in entries:
+        comment = (entry["comment"] or "").strip()
+        normalized = " ".join(comment.lower().split())
+        if normalized in seen:
+            continue
+        seen.add(normalized)
+        text = f"{trim_to_tokens(comment, comment_tokens)}\n\n" if comment else "\n"
+        if size + estimate_tokens(text) > max_tokens:
+            break
+        parts.append(text)
+        size += estimate_tokens(text)
+    return "".join(parts)
+
+
+def _pack_prompts(blocks: list, max_tokens: int) -> list:
+    """
+    Pack (group header, text) blocks into prompts of about max_tokens tokens.
+
+    Blocks are never split; the group header is written before the first block
+    of its group in every prompt.
+    """
+    prompts = []
+    current, size, current_header = [], 0, None
+    for header, text in blocks:
+        addition = text if header == current_header else header + text
+        if current and size + estimate_tokens(addition) > max_tokens:
+            prompts.append("".join(current))
+            current, size = [], 0
+            addition = header + text
+        current.append(addition)
+        size += estimate_tokens(addition)
+        current_header = header
+    if current:
+        prompts.append("".join(current))
+    return prompts or [""]
+
+
+def worklog_to_prompts(worklog_entries: dict, max_tokens: int = None, comment_tokens: int = None) -> list:
+    """
+    Convert worklog entries to prompts for the neuro service.
+
+    Returns:
+        list: One prompt if the worklog fits into LLM_PROMPT_TOKENS, otherwise
+            several prompts with whole issues to be summarized separately
+    """
+    max_tokens = max_tokens or settings.LLM_PROMPT_TOKENS
+    comment_tokens = comment_tokens or settings.LLM_COMMENT_TOKENS
+    blocks = [
+        ("", _issue_prompt(issue_key, entries, max_tokens, comment_tokens))
+        for issue_key, entries in worklog_entries.items()
+    ]
+    return _pack_prompts(blocks, max_tokens)
+
+
+def team_worklog_to_prompts(team_entries: dict, max_tokens: int = None, comment_tokens: int = None) -> list:
+    """Convert worklog entries of a team to prompts for the neuro service, see `worklog_to_prompts`."""
+    max_tokens = max_tokens or settings.LLM_PROMPT_TOKENS
+    comment_tokens = comment_tokens or settings.LLM_COMMENT_TOKENS
+    blocks = []
+    for author, worklog_entries in team_entries.items():
+        if not worklog_entries:
+            continue
+        name = next(iter(worklog_entries.values()))[0]["author"]
+        header = f"Сотрудник: {name}\n\n"
+        budget = max_tokens - estimate_tokens(header)
+        blocks.extend(
+            (header, _issue_prompt(issue_key, entries, budget, comment_tokens))
+            for issue_key, entries in worklog_entries.items()
+        )
+    return _pack_prompts(blocks, max_tokens)
+
+
+def renumber_summary(summary: str, offset: int) -> tuple:
+    """
+    Shift item numbers of a numbered summary by offset.
+
+    Returns:
+        tuple: Renumbered text and the last top-level number in it
+    """
+    last = offset
+    for match in _SUMMARY_ITEM.finditer(summary):
+        if not match.group(1):
+            last = max(last, int(match.group(2)) + offset)
+    text = _SUMMARY_ITEM.sub(lambda m: f"{m.group(1)}{int(m.group(2)) + offset}", summary.strip())
+    return text, last
+
+
+def merge_summaries(summaries: list) -> str:
+    """Join summaries of worklog parts into one numbered list."""
+    parts = []
+    offset = 0
+    for summary in summaries:
+        text, offset = renumber_summary(summary, offset)
+        parts.append(text)
+    return "\n\n".join(parts)
 
 
 def parse_jira_datetime(dt_str: str) -> datetime:
@@ -66,5 +328,22 @@ def parse_jira_datetime(dt_str: str) -> datetime:
             return datetime.strptime(dt_str, "%Y-%m-%d %H:%M:%S")
 
 def format_issue_message(issue_key: str, summary: str, status: str) -> str:
-    """Format Jira issue message for Telegram."""
-    return f"🎯 *Задача:* [{issue_key}]({settings.JIRA_URL}/browse/{issue_key})\n📝 *Название:* {summary}\n📊 *Статус:* {status}"
+    """Format Jira issue message for Telegram (MarkdownV2)."""
+    safe_url = escape_markdown(f"{settings.JIRA_URL}/browse/{issue_key}")
+    return (
+        f"🎯 *Задача:* [{escape_markdown(issue_key)}]({safe_url})\n"
+        f"📝 *Название:* {escape_markdown(summary)}\n"
+        f"📊 *Статус:* {escape_markdown(status)}"
+    )
+
+
+def parse_issue_keys(text: str) -> list:
+    """Extract unique Jira issue keys from the text, keeping their order."""
+    return list(dict.fromkeys(_ISSUE_KEY.findall(text.upper())))
+
+
+def split_issue_keys(text: str) -> tuple:
+    """Split the text into unique issue keys and the rest of the text without them."""
+    keys = parse_issue_keys(text)
+    rest = re.sub(_ISSUE_KEY.pattern, " ", text, flags=re.IGNORECASE)
+    return keys, " ".join(rest.split())
@@ -0,0 +1,98 @@
+"""
+Micro-benchmarks for worklog report rendering.
+
+Usage:
+    python -m benchmarks.bench_formatting [--issues 100] [--entries 10] [--json]
+"""
+import argparse
+import json
+import random
+import timeit
+
+from app.utils.helpers import (
+    escape_markdown,
+    format_jira_date,
+    format_worklog_messages,
+    parse_jira_datetime,
+    worklog_to_prompts,
+)
+
+WORDS = (
+    "сделал исправил ошибку в модуле оплаты добавил тесты обсудили с командой "
+    "релиз деплой review api v2.1 PROJ-123 (hotfix) config_file settings.py!"
+).split()
+
+
+def escape_markdown_replace(text: str) -> str:
+    """Previous implementation with one str.replace pass per character, kept as a baseline."""
+    for char in ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']:
+        text = text.replace(char, f'\\{char}')
+    return text
+
+
+def make_worklog(issues: int, entries: int, seed: int = 0) -> dict:
+    """Generate a worklog in the shape returned by the worklog store."""
+    rnd = random.Random(seed)
+    worklog = {}
+    for i in range(issues):
+        key = f"PROJ-{1000 + i}"
+        summary = " ".join(rnd.choice(WORDS) for _ in range(8))
+        worklog[key] = [
+            {
+                "issue_key": key,
+                "issue_summary": summary,
+                "date": f"2024-01-{1 + j % 28:02d}T{9 + j % 8:02d}:30:00.000+0300",
+                "time_spent": f"{1 + j % 4}h 30m",
+                "time_spent_seconds": 5400,
+                "comment": " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(0, 60))),
+                "author": "Engineer",
+                "created": "",
+                "updated": "",
+            }
+            for j in range(entries)
+        ]
+    return worklog
+
+
+def bench(func, number: int) -> float:
+    """Return the mean time of one call in microseconds."""
+    return timeit.timeit(func, number=number) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--issues", type=int, default=100)
+    parser.add_argument("--entries", type=int, default=10)
+    parser.add_argument("--number", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    worklog = make_worklog(args.issues, args.entries)
+    comments = [entry["comment"] for entries in worklog.values() for entry in entries]
+    dates = [entry["date"] for entries in worklog.values() for entry in entries]
+    messages = format_worklog_messages(worklog)
+
+    results = {
+        "issues": args.issues,
+        "entries_per_issue": args.entries,
+        "messages": len(messages),
+        "max_message_length": max(len(m) for m in messages),
+        "escape_markdown_us": bench(lambda: [escape_markdown(c) for c in comments], args.number),
+        "escape_markdown_replace_us": bench(lambda: [escape_markdown_replace(c) for c in comments], args.number),
+        "format_jira_date_us": bench(lambda: [format_jira_date(d) for d in dates], args.number),
+        "parse_jira_datetime_strftime_us": bench(
+            lambda: [parse_jira_datetime(d).strftime("%d\\-%m\\-%y %H:%M") for d in dates], args.number
+        ),
+        "format_worklog_messages_us": bench(lambda: format_worklog_messages(worklog), args.number),
+        "worklog_to_prompts_us": bench(lambda: worklog_to_prompts(worklog), args.number),
+    }
+
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for name, value in results.items():
+            print(f"{name:32} {value:,.1f}" if isinstance(value, float) else f"{name:32} {value}")
+
+
+if __name__ == "__main__":
+    main()
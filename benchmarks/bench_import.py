@@ -0,0 +1,88 @@
+"""
+Import-time budget check.
+
+Imports each module in a fresh interpreter several times and compares the
+best time with its budget. Importing must also be free of side effects: no
+output and no database file. Exits with status 1 if a check fails, so it can
+run as a CI step.
+
+Usage:
+    python -m benchmarks.bench_import [--repeat 5] [--json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# Бюджеты в миллисекундах, с запасом для медленных CI-машин
+BUDGETS_MS = {
+    "app.utils.helpers": 100,
+    "app.services.telegram": 700,
+}
+
+SNIPPET = (
+    "import time; started = time.perf_counter(); import {module}; "
+    "import sys; sys.stderr.write(str((time.perf_counter() - started) * 1000))"
+)
+
+
+def measure(module: str, env: dict) -> tuple:
+    """Import the module in a new interpreter. Returns (milliseconds, stdout)."""
+    result = subprocess.run(
+        [sys.executable, "-c", SNIPPET.format(module=module)],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    return float(result.stderr.strip().splitlines()[-1]), result.stdout
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="jira-bot-import-")
+    database = os.path.join(workdir, "import.db")
+    env = {
+        **os.environ,
+        "BOT_TOKEN": os.environ.get("BOT_TOKEN", "1:import-check"),
+        "DATABASE_URL": f"sqlite:///{database}",
+    }
+
+    results = {}
+    failed = False
+    for module, budget in BUDGETS_MS.items():
+        times = []
+        output = ""
+        for _ in range(args.repeat):
+            elapsed, stdout = measure(module, env)
+            times.append(elapsed)
+            output += stdout
+        best = min(times)
+        ok = best <= budget and not output and not os.path.exists(database)
+        failed |= not ok
+        results[module] = {
+            "best_ms": round(best, 1),
+            "budget_ms": budget,
+            "stdout": bool(output),
+            "database_created": os.path.exists(database),
+            "ok": ok,
+        }
+
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for module, result in results.items():
+            status = "ok" if result["ok"] else "FAIL"
+            print(f"{module:28} {result['best_ms']:8.1f} ms  (budget {result['budget_ms']} ms)  {status}")
+            if result["stdout"]:
+                print("    import printed to stdout")
+            if result["database_created"]:
+                print("    import created the database")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
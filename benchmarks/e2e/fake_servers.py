@@ -0,0 +1,357 @@
+"""
+Local stand-ins for the Jira REST API, the Telegram Bot API and Ollama.
+
+The servers implement only what the bot uses, generate deterministic data
+and add a configurable latency to every request.
+"""
+import asyncio
+import json
+import re
+import time
+from datetime import datetime
+from urllib.parse import parse_qsl
+
+from aiohttp import web
+
+
+class FakeServer:
+    """Base class running an aiohttp application on a free local port."""
+
+    def __init__(self, latency: float = 0.0):
+        """
+        Args:
+            latency (float): Delay added to every request, in seconds
+        """
+        self.latency = latency
+        self.requests = 0
+        self.port = None
+        self._runner = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def routes(self, app: web.Application):
+        raise NotImplementedError
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return await handler(request)
+
+    async def start(self):
+        app = web.Application(middlewares=[self._middleware])
+        self.routes(app)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+class FakeJira(FakeServer):
+    """Jira REST API v2 with generated issues and worklogs authored by the caller."""
+
+    TRANSITIONS = [
+        {"id": "11", "name": "In Progress", "to": {"name": "In Progress"}},
+        {"id": "21", "name": "Done", "to": {"name": "Done"}},
+    ]
+
+    def __init__(self, issues: int, worklogs_per_issue: int, latency: float = 0.0):
+        super().__init__(latency)
+        self.issue_count = issues
+        self.worklogs_per_issue = worklogs_per_issue
+        self.created_ms = int(time.time() * 1000)
+        self.started = datetime.now().strftime("%Y-%m-%dT%H:%M:%S.000+0300")
+        self.endpoints = {}
+
+    def routes(self, app):
+        prefix = "/rest/api/2"
+        app.router.add_get(f"{prefix}/myself", self.myself)
+        app.router.add_get(f"{prefix}/search", self.search)
+        app.router.add_post(f"{prefix}/search", self.search)
+        app.router.add_get(f"{prefix}/issue/{{key}}", self.issue)
+        app.router.add_get(f"{prefix}/issue/{{key}}/worklog", self.issue_worklogs)
+        app.router.add_get(f"{prefix}/issue/{{key}}/transitions", self.transitions)
+        app.router.add_post(f"{prefix}/issue/{{key}}/transitions", self.transition)
+        app.router.add_get(f"{prefix}/worklog/updated", self.updated)
+        app.router.add_get(f"{prefix}/worklog/deleted", self.deleted)
+        app.router.add_post(f"{prefix}/worklog/list", self.worklog_list)
+
+    @staticmethod
+    def _user(request) -> str:
+        return request.headers.get("Authorization", "").removeprefix("Bearer ") or "anonymous"
+
+    def _count(self, name: str):
+        self.endpoints[name] = self.endpoints.get(name, 0) + 1
+
+    def _issue(self, index: int, fields=None, user: str = None) -> dict:
+        data = {
+            "id": str(10000 + index),
+            "key": f"BENCH-{index + 1}",
+            "fields": {
+                "summary": f"Benchmark issue number {index + 1}",
+                "status": {"name": "In Progress"},
+                "project": {"key": "BENCH"},
+                "issuetype": {"name": "Task"},
+            },
+        }
+        if user is not None:
+            worklogs = [self._worklog(index, j, user) for j in range(self.worklogs_per_issue)]
+            data["fields"]["worklog"] = {
+                "startAt": 0,
+                "maxResults": 20,
+                "total": len(worklogs),
+                "worklogs": worklogs[:20],
+            }
+        if fields:
+            data["fields"] = {k: v for k, v in data["fields"].items() if k in fields}
+        return data
+
+    def _worklog(self, issue_index: int, number: int, user: str) -> dict:
+        return {
+            "id": str(issue_index * self.worklogs_per_issue + number + 1),
+            "issueId": str(10000 + issue_index),
+            "started": self.started,
+            "timeSpent": "1h 30m",
+            "timeSpentSeconds": 5400,
+            "comment": f"Сделал часть {number + 1} задачи: исправил ошибку, добавил тесты и обновил документацию.",
+            "author": {"name": user, "key": user, "displayName": user},
+            "created": self.started,
+            "updated": self.started,
+        }
+
+    def _index(self, key: str):
+        match = re.fullmatch(r"BENCH-(\d+)", key)
+        if not match or not 0 < int(match.group(1)) <= self.issue_count:
+            return None
+        return int(match.group(1)) - 1
+
+    async def myself(self, request):
+        self._count("myself")
+        user = self._user(request)
+        return web.json_response({"name": user, "key": user, "displayName": user})
+
+    async def search(self, request):
+        self._count("search")
+        params = dict(request.query)
+        if request.method == "POST":
+            params.update(await request.json())
+        jql = params.get("jql", "")
+        start_at = int(params.get("startAt", 0))
+        max_results = int(params.get("maxResults", 50))
+        fields = params.get("fields")
+        if isinstance(fields, str):
+            fields = fields.split(",")
+        user = self._user(request)
+
+        in_list = re.search(r"\b(id|key) in \(([^)]*)\)", jql)
+        if in_list:
+            values = [v.strip().strip("'\"") for v in in_list.group(2).split(",")]
+            if in_list.group(1) == "id":
+                indexes = [int(v) - 10000 for v in values if v.isdigit()]
+            else:
+                indexes = [self._index(v) for v in values]
+            indexes = [i for i in indexes if i is not None and 0 <= i < self.issue_count]
+        else:
+            indexes = list(range(self.issue_count))
+
+        with_worklog = not fields or "worklog" in fields
+        page = indexes[start_at:start_at + max_results]
+        return web.json_response({
+            "startAt": start_at,
+            "maxResults": max_results,
+            "total": len(indexes),
+            "issues": [self._issue(i, fields, user if with_worklog else None) for i in page],
+        })
+
+    async def issue(self, request):
+        self._count("issue")
+        index = self._index(request.match_info["key"])
+        if index is None:
+            return web.json_response({"errorMessages": ["Issue does not exist"], "errors": {}}, status=404)
+        fields = request.query.get("fields")
+        data = self._issue(index, fields.split(",") if fields else None)
+        if "transitions" in request.query.get("expand", ""):
+            data["transitions"] = self.TRANSITIONS
+        return web.json_response(data)
+
+    async def issue_worklogs(self, request):
+        self._count("issue_worklog")
+        index = self._index(request.match_info["key"])
+        user = self._user(request)
+        worklogs = [self._worklog(index, j, user) for j in range(self.worklogs_per_issue)]
+        return web.json_response({"startAt": 0, "maxResults": len(worklogs), "total": len(worklogs), "worklogs": worklogs})
+
+    async def transitions(self, request):
+        self._count("transitions")
+        return web.json_response({"transitions": self.TRANSITIONS})
+
+    async def transition(self, request):
+        self._count("transition")
+        return web.Response(status=204)
+
+    async def updated(self, request):
+        self._count("worklog_updated")
+        since = int(request.query.get("since", 0))
+        total = self.issue_count * self.worklogs_per_issue
+        values = []
+        if since <= self.created_ms:
+            values = [{"worklogId": i + 1, "updatedTime": self.created_ms} for i in range(total)]
+        return web.json_response({
+            "values": values,
+            "since": since,
+            "until": int(time.time() * 1000),
+            "lastPage": True,
+        })
+
+    async def deleted(self, request):
+        self._count("worklog_deleted")
+        since = int(request.query.get("since", 0))
+        return web.json_response({"values": [], "since": since, "until": int(time.time() * 1000), "lastPage": True})
+
+    async def worklog_list(self, request):
+        self._count("worklog_list")
+        user = self._user(request)
+        ids = (await request.json())["ids"]
+        worklogs = []
+        for worklog_id in ids:
+            index, number = divmod(int(worklog_id) - 1, self.worklogs_per_issue)
+            if index < self.issue_count:
+                worklogs.append(self._worklog(index, number, user))
+        return web.json_response(worklogs)
+
+
+class FakeTelegram(FakeServer):
+    """Telegram Bot API recording every sent and edited message."""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__(latency)
+        self.message_id = 0
+        self.calls = {}
+        self.errors = 0
+        self.updates = asyncio.Queue()
+
+    def routes(self, app):
+        app.router.add_route("*", "/bot{token}/{method}", self.handle)
+
+    def _message(self, chat_id, text) -> dict:
+        self.message_id += 1
+        return {
+            "message_id": self.message_id,
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "private"},
+            "from": {"id": 1, "is_bot": True, "first_name": "bench"},
+            "text": text,
+        }
+
+    async def handle(self, request):
+        method = request.match_info["method"]
+        self.calls[method] = self.calls.get(method, 0) + 1
+        # telebot отправляет параметры формой и в GET-запросах, post() их не читает
+        params = dict(request.query)
+        if request.content_type == "application/x-www-form-urlencoded":
+            params.update(parse_qsl((await request.read()).decode()))
+
+        if method in ("sendMessage", "editMessageText"):
+            text = params.get("text", "")
+            if text.startswith("❌"):
+                self.errors += 1
+            result = self._message(params.get("chat_id", 0), text)
+        elif method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        elif method == "getUpdates":
+            try:
+                update = await asyncio.wait_for(self.updates.get(), float(params.get("timeout", 1)))
+                result = [update]
+            except asyncio.TimeoutError:
+                result = []
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+
+class FakeOllama(FakeServer):
+    """Ollama API generating a fixed answer token by token."""
+
+    def __init__(self, tokens: int, token_interval: float, latency: float = 0.0):
+        """
+        Args:
+            tokens (int): Number of tokens in every answer
+            token_interval (float): Delay between streamed tokens, in seconds
+            latency (float): Delay before the first token (prefill), in seconds
+        """
+        super().__init__(latency)
+        self.tokens = tokens
+        self.token_interval = token_interval
+        self.chats = 0
+
+    def routes(self, app):
+        app.router.add_post("/api/chat", self.chat)
+        app.router.add_post("/api/create", self.create)
+        app.router.add_post("/api/generate", self.generate)
+        app.router.add_get("/api/ps", self.ps)
+        app.router.add_get("/api/tags", self.ps)
+
+    @staticmethod
+    def _chunk(model, content, done, **extra) -> dict:
+        return {
+            "model": model,
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "message": {"role": "assistant", "content": content},
+            "done": done,
+            **extra,
+        }
+
+    def _stats(self, prompt: str) -> dict:
+        return {
+            "prompt_eval_count": max(1, len(prompt) // 4),
+            "eval_count": self.tokens,
+            "eval_duration": int(self.tokens * self.token_interval * 1e9),
+            "prompt_eval_duration": int(self.latency * 1e9),
+        }
+
+    async def chat(self, request):
+        self.chats += 1
+        body = await request.json()
+        model = body.get("model", "")
+        prompt = "".join(m.get("content", "") for m in body.get("messages", []))
+        words = [f"{i + 1}. Сделал задачу.\n" if i % 5 == 4 else "Сделал " for i in range(self.tokens)]
+
+        if not body.get("stream", True):
+            await asyncio.sleep(self.tokens * self.token_interval)
+            return web.json_response(
+                {**self._chunk(model, "".join(words), True), **self._stats(prompt)}
+            )
+
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        for word in words:
+            await response.write((json.dumps(self._chunk(model, word, False)) + "\n").encode())
+            if self.token_interval:
+                await asyncio.sleep(self.token_interval)
+        final = {**self._chunk(model, "", True), **self._stats(prompt)}
+        await response.write((json.dumps(final) + "\n").encode())
+        await response.write_eof()
+        return response
+
+    async def create(self, request):
+        return web.json_response({"status": "success"})
+
+    async def generate(self, request):
+        body = await request.json()
+        return web.json_response({
+            "model": body.get("model", ""),
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "response": "",
+            "done": True,
+        })
+
+    async def ps(self, request):
+        return web.json_response({"models": []})
@@ -0,0 +1,218 @@
+"""
+Offline end-to-end benchmark of the bot commands.
+
+Starts local fake Jira, Telegram and Ollama servers, points the bot at them and
+feeds Telegram updates from several simulated users straight into the real
+handlers. Latency of every command is measured from receiving the update to
+the last message of the answer, and the results are printed as JSON.
+
+Run it from the repository root:
+
+    python -m benchmarks.e2e.run --users 20 --iterations 5
+    python -m benchmarks.e2e.run --commands worklog_neuro --ollama-token-interval 0.02
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.e2e.fake_servers import FakeJira, FakeOllama, FakeTelegram
+
+COMMANDS = ("worklog", "get_issue", "worklog_neuro", "move")
+
+# Сколько задач переводит в другой статус одна команда /move
+MOVE_BATCH = 10
+
+# Идентификаторы пользователей начинаются с этого значения, чат у каждого свой
+USER_ID_BASE = 100000
+
+
+def percentile(values: list, p: float) -> float:
+    """Percentile by the nearest-rank method."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def summarize(latencies: list, wall_time: float) -> dict:
+    ms = [value * 1000 for value in latencies]
+    return {
+        "count": len(ms),
+        "mean_ms": round(sum(ms) / len(ms), 2),
+        "p50_ms": round(percentile(ms, 50), 2),
+        "p95_ms": round(percentile(ms, 95), 2),
+        "p99_ms": round(percentile(ms, 99), 2),
+        "max_ms": round(max(ms), 2),
+        "commands_per_sec": round(len(ms) / wall_time, 2),
+    }
+
+
+def make_update(update_id: int, user_id: int, text: str) -> dict:
+    update = {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+            "text": text,
+        },
+    }
+    if text.startswith("/"):
+        command = text.split()[0]
+        update["message"]["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+    return update
+
+
+class Driver:
+    """Feeds updates into the bot and waits until they are handled."""
+
+    def __init__(self, telegram_module, args):
+        self.tg = telegram_module
+        self.args = args
+        self.update_id = 0
+
+    async def send(self, user_id: int, text: str):
+        from telebot.types import Update
+
+        self.update_id += 1
+        update = Update.de_json(make_update(self.update_id, user_id, text))
+        await self.tg.bot.process_new_updates([update])
+
+    async def worklog(self, user_id: int, iteration: int):
+        await self.send(user_id, "/worklog")
+
+    async def get_issue(self, user_id: int, iteration: int):
+        # Ключ задачи обрабатывается после /get_issue, замеряем весь диалог
+        await self.send(user_id, "/get_issue")
+        await self.send(user_id, f"BENCH-{iteration % self.args.issues + 1}")
+
+    async def worklog_neuro(self, user_id: int, iteration: int):
+        text = "/worklog_neuro" if self.args.llm_cache else "/worklog_neuro refresh"
+        await self.send(user_id, text)
+        while self.tg.llm_queue.has_job(user_id):
+            await asyncio.sleep(0.005)
+
+    async def move(self, user_id: int, iteration: int):
+        first = iteration * MOVE_BATCH
+        keys = " ".join(f"BENCH-{(first + i) % self.args.issues + 1}" for i in range(MOVE_BATCH))
+        await self.send(user_id, f"/move {keys} Done")
+
+    async def run_command(self, command: str) -> dict:
+        handler = getattr(self, command)
+        latencies = []
+
+        async def user(user_id):
+            for iteration in range(self.args.iterations):
+                started = time.perf_counter()
+                await handler(user_id, iteration)
+                latencies.append(time.perf_counter() - started)
+
+        # Прогрев: первая синхронизация ворклогов и создание клиентов
+        if self.args.warmup:
+            await asyncio.gather(*(handler(USER_ID_BASE + i, 0) for i in range(self.args.users)))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user(USER_ID_BASE + i) for i in range(self.args.users)))
+        return summarize(latencies, time.perf_counter() - started)
+
+
+async def run(args) -> dict:
+    jira = FakeJira(args.issues, args.worklogs_per_issue, latency=args.jira_latency)
+    telegram = FakeTelegram(latency=args.telegram_latency)
+    ollama = FakeOllama(args.ollama_tokens, args.ollama_token_interval, latency=args.ollama_latency)
+    for server in (jira, telegram, ollama):
+        await server.start()
+
+    workdir = tempfile.mkdtemp(prefix="jira-bot-bench-")
+    os.environ.update({
+        "BOT_TOKEN": "1:benchmark",
+        "JIRA_URL": jira.url,
+        "OLLAMA_HOST": ollama.url,
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "TELEGRAM_EDIT_INTERVAL": str(args.edit_interval),
+        "STATE_STORAGE": "memory",
+    })
+
+    from telebot import asyncio_helper
+    from app.core.database import init_db
+    from app.services import telegram as tg
+    from app.services.users import user_tokens
+
+    init_db()
+    tg.create_bot()
+
+    logging.getLogger().setLevel(logging.WARNING if args.verbose else logging.ERROR)
+    asyncio_helper.API_URL = telegram.url + "/bot{0}/{1}"
+
+    for i in range(args.users):
+        await user_tokens.set(USER_ID_BASE + i, f"bench-token-{i}")
+
+    driver = Driver(tg, args)
+    results = {}
+    try:
+        for command in args.commands:
+            jira_before, telegram_before = jira.requests, telegram.requests
+            results[command] = await driver.run_command(command)
+            results[command]["jira_requests"] = jira.requests - jira_before
+            results[command]["telegram_requests"] = telegram.requests - telegram_before
+    finally:
+        await tg.llm_queue.close()
+        await tg.jira_clients.aclose()
+        if asyncio_helper.session_manager.session is not None:
+            await tg.bot.close_session()
+        for server in (jira, telegram, ollama):
+            await server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "config": {
+            key: value for key, value in vars(args).items() if key not in ("output", "verbose")
+        },
+        "results": results,
+        "errors": telegram.errors,
+        "jira_endpoints": jira.endpoints,
+        "telegram_calls": telegram.calls,
+        "ollama_chats": ollama.chats,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--commands", nargs="+", choices=COMMANDS, default=list(COMMANDS))
+    parser.add_argument("--users", type=int, default=10, help="simulated users sending commands concurrently")
+    parser.add_argument("--iterations", type=int, default=5, help="commands sent by every user")
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false",
+                        help="measure the first (cold) command of every user as well")
+    parser.add_argument("--issues", type=int, default=30)
+    parser.add_argument("--worklogs-per-issue", type=int, default=5)
+    parser.add_argument("--jira-latency", type=float, default=0.05, help="seconds per Jira request")
+    parser.add_argument("--telegram-latency", type=float, default=0.03, help="seconds per Telegram request")
+    parser.add_argument("--ollama-latency", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--ollama-tokens", type=int, default=100)
+    parser.add_argument("--ollama-token-interval", type=float, default=0.005)
+    parser.add_argument("--edit-interval", type=float, default=0.5,
+                        help="TELEGRAM_EDIT_INTERVAL used while streaming")
+    parser.add_argument("--llm-cache", action="store_true",
+                        help="allow cached neuro answers instead of forcing refresh")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--verbose", action="store_true", help="show warnings logged by the bot")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
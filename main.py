@@ -1,4 +1,6 @@
+from app.bootstrap import bootstrap
 from app.services.telegram import start_bot
 
 if __name__ == "__main__":
-    start_bot() 
\ No newline at end of file
+    bootstrap()
+    start_bot() 
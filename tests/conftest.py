@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# Настройки читаются при импорте app.core.config, поэтому задаем их до импорта приложения
+_workdir = tempfile.mkdtemp(prefix="jira-bot-tests-")
+os.environ.setdefault("BOT_TOKEN", "1:test")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_workdir, 'test.db')}")
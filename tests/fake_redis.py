@@ -0,0 +1,123 @@
+import asyncio
+import time
+
+
+class FakeRedis:
+    """
+    In-process server speaking enough of the Redis protocol for the state storage.
+
+    Supports AUTH, SELECT, GET, SET with EX, EXPIRE, TTL and DEL, keeps every
+    received command in `commands` and can drop client connections to
+    exercise reconnects.
+    """
+
+    def __init__(self, password: str = None):
+        self.password = password
+        self.data = {}  # key -> value
+        self.expires = {}  # key -> monotonic deadline
+        self.commands = []
+        self.connections = 0
+        self._server = None
+        self._writers = set()
+
+    @property
+    def url(self) -> str:
+        port = self._server.sockets[0].getsockname()[1]
+        auth = f":{self.password}@" if self.password else ""
+        return f"redis://{auth}127.0.0.1:{port}"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+
+    async def stop(self):
+        self.drop_connections()
+        self._server.close()
+        await self._server.wait_closed()
+
+    def drop_connections(self):
+        for writer in list(self._writers):
+            writer.close()
+        self._writers.clear()
+
+    def ttl(self, key: str) -> float:
+        return self.expires[key] - time.monotonic() if key in self.expires else -1
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        self._writers.add(writer)
+        authenticated = self.password is None
+        try:
+            while True:
+                args = await self._read_command(reader)
+                if args is None:
+                    break
+                self.commands.append(args)
+                name = args[0].upper()
+                if name == "AUTH":
+                    authenticated = args[1] == self.password
+                    writer.write(b"+OK\r\n" if authenticated else b"-WRONGPASS invalid password\r\n")
+                elif not authenticated:
+                    writer.write(b"-NOAUTH Authentication required.\r\n")
+                else:
+                    writer.write(self._execute(name, args[1:]))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    @staticmethod
+    async def _read_command(reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        assert line.startswith(b"*"), line
+        args = []
+        for _ in range(int(line[1:-2])):
+            header = await reader.readline()
+            assert header.startswith(b"$"), header
+            data = await reader.readexactly(int(header[1:-2]) + 2)
+            assert data.endswith(b"\r\n"), data
+            args.append(data[:-2].decode())
+        return args
+
+    def _expire_stale(self):
+        now = time.monotonic()
+        for key in [k for k, deadline in self.expires.items() if deadline <= now]:
+            self.data.pop(key, None)
+            del self.expires[key]
+
+    def _execute(self, name: str, args: list) -> bytes:
+        self._expire_stale()
+        if name == "SELECT":
+            return b"+OK\r\n"
+        if name == "GET":
+            value = self.data.get(args[0])
+            if value is None:
+                return b"$-1\r\n"
+            encoded = value.encode()
+            return b"$%d\r\n%s\r\n" % (len(encoded), encoded)
+        if name == "SET":
+            key, value, options = args[0], args[1], [a.upper() for a in args[2:]]
+            self.data[key] = value
+            self.expires.pop(key, None)
+            if "EX" in options:
+                self.expires[key] = time.monotonic() + int(args[2 + options.index("EX") + 1])
+            return b"+OK\r\n"
+        if name == "EXPIRE":
+            if args[0] not in self.data:
+                return b":0\r\n"
+            self.expires[args[0]] = time.monotonic() + int(args[1])
+            return b":1\r\n"
+        if name == "TTL":
+            if args[0] not in self.data:
+                return b":-2\r\n"
+            return b":%d\r\n" % int(self.ttl(args[0]))
+        if name == "DEL":
+            deleted = 0
+            for key in args:
+                deleted += self.data.pop(key, None) is not None
+                self.expires.pop(key, None)
+            return b":%d\r\n" % deleted
+        return b"-ERR unknown command '%s'\r\n" % name.encode()
@@ -0,0 +1,62 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.bench_import import BUDGETS_MS, measure
+
+# Тяжелые зависимости, которые должны загружаться при первом использовании, а не при импорте
+DEFERRED = {
+    "app.utils.helpers": ["aiohttp", "httpx", "ollama", "pydantic", "sqlalchemy", "telebot"],
+    "app.services.telegram": ["anyio", "httpx", "ollama", "pydantic", "sqlalchemy.dialects.sqlite"],
+}
+
+# Замер времени зависит от машины, поэтому включается явно: IMPORT_BUDGET=1
+TIMED = os.environ.get("IMPORT_BUDGET", "").lower() in ("1", "true", "yes")
+REPEAT = 3
+
+
+@pytest.fixture
+def env(tmp_path):
+    return {
+        **os.environ,
+        "BOT_TOKEN": "1:import-check",
+        "DATABASE_URL": f"sqlite:///{tmp_path / 'import.db'}",
+        "STATE_STORAGE": "redis",
+        "REDIS_URL": "redis://127.0.0.1:1/0",
+    }
+
+
+def run_python(code: str, env: dict) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+
+
+@pytest.mark.parametrize("module", sorted(DEFERRED))
+def test_import_defers_heavy_modules(module, env, tmp_path):
+    code = (
+        f"import sys, json; import {module}; "
+        f"sys.stderr.write(json.dumps([m for m in {DEFERRED[module]!r} if m in sys.modules]))"
+    )
+    result = run_python(code, env)
+    assert result.stdout == ""
+    assert json.loads(result.stderr.strip().splitlines()[-1]) == []
+    assert not (tmp_path / "import.db").exists()
+
+
+@pytest.mark.skipif(not TIMED, reason="set IMPORT_BUDGET=1 to check import times")
+@pytest.mark.parametrize("module", sorted(BUDGETS_MS))
+def test_import_within_budget(module, env):
+    best = min(measure(module, env)[0] for _ in range(REPEAT))
+    assert best <= BUDGETS_MS[module], f"import {module} took {best:.0f} ms"
+
+
+def test_import_does_not_create_bot(env):
+    # Бот и хранилище состояний (здесь Redis на закрытом порту) создаются только в bootstrap()
+    run_python(
+        "import app.services.telegram as tg; "
+        "assert tg.bot is None and tg.state_storage is None; "
+        "tg.create_bot(); assert tg.bot is not None",
+        env,
+    )
@@ -0,0 +1,145 @@
+import asyncio
+
+import pytest
+
+from app.core.database import init_db
+from app.core.state_storage import RedisConnection, RedisError, RedisStateStorage, SQLStateStorage
+from tests.fake_redis import FakeRedis
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def round_trip(storage):
+    """Полный цикл состояния: установка, данные, сброс и удаление."""
+    assert await storage.get_state(1, 2) is None
+    assert await storage.get_data(1, 2) is None
+
+    await storage.set_state(1, 2, "waiting_for_token")
+    assert await storage.get_state(1, 2) == "waiting_for_token"
+    assert await storage.get_data(1, 2) == {}
+
+    await storage.set_data(1, 2, "issue_key", "PROJ-1")
+    await storage.set_data(1, 2, "text", "строка с \r\n переводами")
+    assert await storage.get_data(1, 2) == {"issue_key": "PROJ-1", "text": "строка с \r\n переводами"}
+
+    # Состояние другого пользователя в том же чате независимо
+    await storage.set_state(1, 3, "other")
+    assert await storage.get_state(1, 3) == "other"
+    assert await storage.get_state(1, 2) == "waiting_for_token"
+
+    assert await storage.reset_data(1, 2)
+    assert await storage.get_data(1, 2) == {}
+    assert await storage.get_state(1, 2) == "waiting_for_token"
+
+    assert await storage.delete_state(1, 2)
+    assert await storage.get_state(1, 2) is None
+    assert not await storage.delete_state(1, 2)
+    with pytest.raises(RuntimeError):
+        await storage.set_data(1, 2, "key", "value")
+
+
+def test_redis_round_trip():
+    async def scenario():
+        server = FakeRedis()
+        await server.start()
+        storage = RedisStateStorage(server.url, ttl=600, cache_ttl=0)
+        try:
+            await round_trip(storage)
+            set_commands = [c for c in server.commands if c[0] == "SET"]
+            assert set_commands and all(c[3:] == ["EX", "600"] for c in set_commands)
+            assert 590 < server.ttl("jira_bot:state:1:3") <= 600
+        finally:
+            await storage.close()
+            await server.stop()
+
+    run(scenario())
+
+
+def test_redis_auth_select_and_expiry():
+    async def scenario():
+        server = FakeRedis(password="secret")
+        await server.start()
+        storage = RedisStateStorage(server.url + "/2", ttl=1, cache_ttl=0)
+        try:
+            await storage.set_state(5, 6, "state")
+            assert server.commands[:2] == [["AUTH", "secret"], ["SELECT", "2"]]
+            assert await storage.get_state(5, 6) == "state"
+            await asyncio.sleep(1.1)
+            assert await storage.get_state(5, 6) is None
+        finally:
+            await storage.close()
+            await server.stop()
+
+    run(scenario())
+
+
+def test_redis_reconnects_after_dropped_connection():
+    async def scenario():
+        server = FakeRedis()
+        await server.start()
+        redis = RedisConnection(server.url)
+        try:
+            assert await redis.execute("SET", "key", "value") == "OK"
+            server.drop_connections()
+            await asyncio.sleep(0.01)
+            assert await redis.execute("GET", "key") == "value"
+            assert server.connections == 2
+            assert await redis.execute("EXPIRE", "key", 30) == 1
+            assert await redis.execute("DEL", "key", "missing") == 1
+            assert await redis.execute("GET", "key") is None
+        finally:
+            await redis.close()
+            await server.stop()
+
+    run(scenario())
+
+
+def test_redis_error_reply():
+    async def scenario():
+        server = FakeRedis()
+        await server.start()
+        redis = RedisConnection(server.url)
+        try:
+            with pytest.raises(RedisError, match="unknown command"):
+                await redis.execute("FLUSHALL")
+            # После ошибки соединение остается рабочим
+            assert await redis.execute("SET", "key", "value") == "OK"
+            assert server.connections == 1
+        finally:
+            await redis.close()
+            await server.stop()
+
+    run(scenario())
+
+
+def test_redis_unavailable():
+    async def scenario():
+        server = FakeRedis()
+        await server.start()
+        url = server.url
+        await server.stop()
+        redis = RedisConnection(url)
+        with pytest.raises(OSError):
+            await redis.execute("GET", "key")
+
+    run(scenario())
+
+
+def test_sql_round_trip():
+    init_db()
+    run(round_trip(SQLStateStorage(ttl=600, cache_ttl=0)))
+
+
+def test_sql_abandoned_state_expires():
+    init_db()
+
+    async def scenario():
+        storage = SQLStateStorage(ttl=1, cache_ttl=0)
+        await storage.set_state(7, 8, "state")
+        assert await storage.get_state(7, 8) == "state"
+        await asyncio.sleep(1.1)
+        assert await storage.get_state(7, 8) is None
+
+    run(scenario())
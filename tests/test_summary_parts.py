@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from app.services import neuro
+from app.services.jobs import Job, JobQueue
+
+PROMPTS = ["a", "b", "c", "d"]
+
+
+class FakeModel:
+    """Отвечает на каждую часть за фиксированное время и считает одновременные генерации."""
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+
+    async def _generate(self, prompt: str) -> str:
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.05)
+        self.active -= 1
+        return f"1. {prompt}"
+
+    async def complete(self, prompt, model, refresh):
+        return await self._generate(prompt)
+
+    async def stream(self, prompt, model, refresh):
+        yield await self._generate(prompt)
+
+
+def summarize_in_queue(monkeypatch, concurrency: int, stream: bool) -> tuple:
+    fake = FakeModel()
+    monkeypatch.setattr(neuro, "_complete", fake.complete)
+    monkeypatch.setattr(neuro, "_stream_message", fake.stream)
+
+    async def main():
+        queue = JobQueue(concurrency, max_size=10)
+        monkeypatch.setattr(neuro, "llm_queue", queue)
+        done = asyncio.get_running_loop().create_future()
+
+        async def run():
+            answer = await neuro.summarize(PROMPTS, stream=stream)
+            if stream:
+                answer = "".join([chunk async for chunk in answer])
+            done.set_result(answer)
+
+        queue.submit(Job(1, run))
+        try:
+            return await done
+        finally:
+            await queue.close()
+
+    return asyncio.run(main()), fake.peak
+
+
+@pytest.mark.parametrize("stream", [False, True])
+@pytest.mark.parametrize("concurrency", [1, 2, 3])
+def test_parts_run_within_queue_concurrency(monkeypatch, concurrency, stream):
+    answer, peak = summarize_in_queue(monkeypatch, concurrency, stream)
+    assert answer == "1. a\n\n2. b\n\n3. c\n\n4. d"
+    assert peak == concurrency